@@ -1,6 +1,16 @@
 __author__ = 'Daniel Maly'
 
-import brainx
+import os
+import sys
+import client
 
 if __name__ == "__main__":
-    brainx.main()
\ No newline at end of file
+    # With a daemon running, the client doesn't even need to import the interpreter
+    path = os.environ.get(client.ENVIRONMENT)
+    if path and '--daemon' not in sys.argv:
+        code = client.run(path, sys.argv[1:])
+        if code is not None:
+            sys.exit(code)
+
+    import brainx
+    brainx.main()
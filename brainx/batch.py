@@ -0,0 +1,242 @@
+__author__ = 'Daniel Maly'
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+from binterpreter import Binterpreter, BracketMismatchError
+from cache import ProgramCache, MemoryCache
+from input_source import InputSource, InputStream
+from lockstep import Lockstep
+from output_receiver import OutputReceiver
+from prefix import Prefix
+from png_decoder import PNGNotImplementedError, PNGWrongHeaderError
+from quota import Quota, QuotaExceededError
+from tape import Tape, TapeLimitError
+
+
+# Same exit codes as the command line, the first matching class counts
+EXIT_CODES = [
+    (PNGWrongHeaderError, 4),
+    (PNGNotImplementedError, 8),
+    (BracketMismatchError, 16),
+    (TapeLimitError, 32),
+    (QuotaExceededError, 64)
+]
+
+
+INPUT_SUFFIX = '.in'
+
+
+# Most inputs of one program run in lockstep together, see run_group
+LOCKSTEP_LANES = 1024
+
+
+# Jobs are pairs (program, input), input being a file or None (no input besides the one in the program). A manifest
+# has one job per line: the program and optionally the input, separated by whitespace and relative to the manifest.
+# Empty lines and lines starting with # are left out.
+def read_manifest(filename):
+    directory = os.path.dirname(os.path.abspath(filename))
+    jobs = []
+    with open(filename) as file:
+        for line in file:
+            parts = line.split()
+            if not parts or parts[0].startswith('#'):
+                continue
+            program = os.path.join(directory, parts[0])
+            inp = os.path.join(directory, parts[1]) if len(parts) > 1 else None
+            jobs.append((program, inp))
+    return jobs
+
+
+# Every file of the directory is a program, except for the files named like a program plus INPUT_SUFFIX, which are
+# the inputs of the programs
+def read_directory(directory):
+    names = set(os.listdir(directory))
+    jobs = []
+    for name in sorted(names):
+        path = os.path.join(directory, name)
+        if name.endswith(INPUT_SUFFIX) and name[:-len(INPUT_SUFFIX)] in names or not os.path.isfile(path):
+            continue
+        inp = path + INPUT_SUFFIX if name + INPUT_SUFFIX in names else None
+        jobs.append((path, inp))
+    return jobs
+
+
+def read_jobs(path):
+    if os.path.isdir(path):
+        return read_directory(path)
+    return read_manifest(path)
+
+
+# Programs prepared by this process, shared by all its jobs
+memory_cache = MemoryCache()
+
+
+def retrieve_source(filename, cache):
+    try:
+        return InputSource.for_file(filename, cache=cache)
+    except UnicodeDecodeError:
+        return InputSource.for_image_file(filename, cache=cache)
+
+
+# Runs one job and returns its result. The options are a dict of
+#   engine, tape                    the classes of the interpreter and of its memory
+#   tape_limit, bidirectional       passed to the memory
+#   eof                             the EOF policy of the input
+#   max_steps, max_time, max_output the quota
+#   no_cache                        True to keep the prepared programs in memory only
+#   lockstep                        True to run the jobs of one program together, see run_group
+def run_job(job, options):
+    program, inp = job
+    result = {'program': program, 'input': inp, 'status': 0, 'error': None, 'output': '', 'steps': None}
+    started = time.perf_counter()
+
+    cache = memory_cache
+    if not options.get('no_cache'):
+        cache = memory_cache.with_parent(ProgramCache.for_source(program))
+
+    output = OutputReceiver('full')
+    output.print_to_stdout = False
+    binterpreter = None
+    try:
+        source = retrieve_source(program, cache)
+        source.eof = options.get('eof', '0')
+        source.stream = InputStream.for_file(inp) if inp is not None else InputStream()
+
+        engine = options.get('engine', Binterpreter)
+        tape = options.get('tape', Tape)(limit=options.get('tape_limit'), bidirectional=options.get('bidirectional'))
+        binterpreter = engine(input_source=source, output_receiver=output, cache=cache, tape=tape)
+        if engine is Binterpreter:
+            binterpreter.prefix = Prefix(cache)
+        quota = Quota(options.get('max_steps'), options.get('max_time'), options.get('max_output'))
+        if quota.steps is not None or quota.seconds is not None or quota.output is not None:
+            binterpreter.quota = quota
+        binterpreter.start()
+    except Exception as ex:
+        result['status'] = 1
+        result['error'] = "{}: {}".format(type(ex).__name__, ex)
+    except BaseException as ex:
+        if not set_error(result, ex):
+            raise
+
+    result['time'] = time.perf_counter() - started
+    if binterpreter is not None and binterpreter.step_count:
+        result['steps'] = binterpreter.step_count
+    # latin-1 keeps every byte as the character of the same code
+    result['output'] = output.output_bytes().decode('latin-1')
+    return result
+
+
+# Fills in the status and the error of result, returns False for an exception that is not an error of the program
+def set_error(result, ex):
+    if isinstance(ex, Exception):
+        result['status'] = 1
+        result['error'] = "{}: {}".format(type(ex).__name__, ex)
+        return True
+    # The errors of brainx are BaseExceptions, anything else (KeyboardInterrupt and the like) stops the batch
+    for cls, code in EXIT_CODES:
+        if isinstance(ex, cls):
+            result['status'] = code
+            result['error'] = str(ex)
+            return True
+    return False
+
+
+def lockstep_supported(options):
+    return options.get('engine', Binterpreter) is Binterpreter and options.get('tape', Tape) is Tape and \
+        options.get('tape_limit') is None and not options.get('bidirectional') and options.get('max_time') is None
+
+
+# Runs jobs of the same program together in a lockstep.Lockstep and returns their results, which are the same as
+# those of run_job except for the time, which is the time of the whole group divided among its jobs. Options the
+# lockstep run doesn't support and anything that stops the program before it starts (a missing input, a broken
+# program) leave the jobs to run_job.
+def run_group(jobs, options):
+    if len(jobs) < 2 or not lockstep_supported(options):
+        return [run_job(job, options) for job in jobs]
+
+    program = jobs[0][0]
+    started = time.perf_counter()
+    cache = memory_cache
+    if not options.get('no_cache'):
+        cache = memory_cache.with_parent(ProgramCache.for_source(program))
+
+    try:
+        source = retrieve_source(program, cache)
+        source.eof = options.get('eof', '0')
+        inputs = []
+        for _, inp in jobs:
+            if inp is None:
+                inputs.append(b'')
+            else:
+                with open(inp, 'rb') as file:
+                    inputs.append(file.read())
+        quota = Quota(options.get('max_steps'), None, options.get('max_output'))
+        if quota.steps is None and quota.output is None:
+            quota = None
+        lockstep = Lockstep(source, inputs, cache=cache, quota=quota)
+        lockstep.prefix = Prefix(cache)
+        lockstep.start()
+    except (Exception,) + tuple(cls for cls, _ in EXIT_CODES):
+        return [run_job(job, options) for job in jobs]
+
+    elapsed = (time.perf_counter() - started) / len(jobs)
+    results = []
+    for (program, inp), lane in zip(jobs, lockstep.lanes):
+        result = {'program': program, 'input': inp, 'status': 0, 'error': None,
+                  'output': lane.output.output_bytes().decode('latin-1'), 'steps': lane.step_count or None,
+                  'time': elapsed}
+        if lane.error is not None and not set_error(result, lane.error):
+            raise lane.error
+        results.append(result)
+    return results
+
+
+def run_job_with_options(arguments):
+    return run_job(*arguments)
+
+
+def run_group_with_options(arguments):
+    indices, jobs, options = arguments
+    return indices, run_group(jobs, options)
+
+
+# Splits the jobs into groups of the same program, every group being a pair (indices of the jobs, jobs). The jobs of
+# a program are spread over the processes, but groups are not smaller than FEW lanes nor larger than LOCKSTEP_LANES.
+def group_jobs(jobs, processes):
+    programs = {}
+    for index, job in enumerate(jobs):
+        programs.setdefault(job[0], []).append(index)
+    groups = []
+    for indices in programs.values():
+        size = min(max(-(-len(indices) // processes), Lockstep.FEW + 1), LOCKSTEP_LANES)
+        for start in range(0, len(indices), size):
+            part = indices[start:start + size]
+            groups.append((part, [jobs[index] for index in part]))
+    return groups
+
+
+# Runs the jobs on a pool of processes (one per core unless processes is given) and writes their results to file as
+# JSON lines, in the order of the jobs, as soon as they are known. With the lockstep option the processes get groups of
+# jobs of the same program instead of single jobs (see group_jobs).
+def run_batch(jobs, options, file=sys.stdout, processes=None):
+    with multiprocessing.Pool(processes) as pool:
+        if not options.get('lockstep'):
+            for result in pool.imap(run_job_with_options, [(job, options) for job in jobs]):
+                file.write(json.dumps(result) + "\n")
+                file.flush()
+            return
+
+        # Results of the later jobs wait for the earlier ones
+        waiting = {}
+        written = 0
+        groups = group_jobs(jobs, processes or os.cpu_count() or 1)
+        for indices, results in pool.imap_unordered(run_group_with_options,
+                                                    [(indices, group, options) for indices, group in groups]):
+            waiting.update(zip(indices, results))
+            while written in waiting:
+                file.write(json.dumps(waiting.pop(written)) + "\n")
+                written += 1
+            file.flush()
@@ -1,132 +1,457 @@
 __author__ = 'Daniel Maly'
 
+from compiler import Compiler, Instruction, BracketMismatchError, ADD, MOVE, OUT, IN, OPEN, CLOSE, DEBUG, END, CLEAR, SCAN, MULTIPLY, BLOCK
+from optimizer import Optimizer
+from quota import Quota
+from snapshot import SnapshotError
+from tape import Tape
+
 
 class Binterpreter:
-    def __init__(self, input_source, output_receiver, test=False):
-        self.memory = bytearray.fromhex('00')
-        self.pointer = 0
+    def __init__(self, input_source, output_receiver, test=False, cache=None, tape=None):
+        # head is the physical index of the current cell in tape.data, see tape.Tape
+        self.tape = tape if tape is not None else Tape()
+        self.head = self.tape.origin
         self.terminated = False
         self.inp = input_source
         self.output = output_receiver
+        # Prompts written by the program have to be seen before it waits for input
+        self.inp.before_read = self.output.before_input
         self.program = input_source.program
-        self.program_pointer = 0
+        self.cache = cache
+        self.code = self.compile_program()
+        self.ip = 0
         self.step_count = 0
         self.print_steps = False
-        self.loop_stack = []
+        self.recorder = None
+        self.profiler = None
+        self.quota = None
+        self.snapshotter = None
+        # prefix.Prefix to start the program from, or to save once the program gets to its first input
+        self.prefix = None
+        # Step count of the next checkpoint
+        self.check_at = Quota.NEVER
+        # Position in the program to start at instead of its beginning (see snapshot.Snapshot)
+        self.resume_position = None
         self.test = test
 
         self.options = {
-            '#': self.print_debug_info,
-            '<': self.move_left,
-            '>': self.move_right,
-            '.': self.out,
-            ',': self.read,
-            '+': self.increment,
-            '-': self.decrement,
-            '[': self.open_loop,
-            ']': self.close_loop
+            ADD: self.add,
+            MOVE: self.move,
+            OUT: self.out,
+            IN: self.read,
+            OPEN: self.open_loop,
+            CLOSE: self.close_loop,
+            DEBUG: self.breakpoint,
+            END: self.finish,
+            CLEAR: self.clear,
+            SCAN: self.scan,
+            MULTIPLY: self.multiply,
+            BLOCK: self.block
         }
 
+    def compile_program(self):
+        if self.cache is not None:
+            code = self.cache.load(self.program, 'code')
+            if code is not None:
+                return list(map(Instruction._make, code))
+
+        code = Optimizer(Compiler(self.program).compile()).optimize()
+        if self.cache is not None:
+            self.cache.store(self.program, 'code', [tuple(instruction) for instruction in code])
+        return code
+
     def initialize_memory(self, memory):
-        self.memory = bytearray(memory)
+        self.tape.load(memory)
+        self.head = self.tape.origin
 
     def initialize_pointer(self, position):
-        self.pointer = position
+        self.head = self.tape.origin + position
+
+    # Used part of the memory
+    @property
+    def memory(self):
+        return self.tape.dump()
+
+    # Position of the current cell in the used part of the memory
+    @property
+    def pointer(self):
+        return self.tape.index(self.head)
+
+    # Position in the source program right after the last executed instruction
+    @property
+    def program_pointer(self):
+        if self.ip == 0:
+            return 0
+        return self.code[self.ip - 1].end
+
+    # Index of the first instruction starting at position in the program
+    def index_at(self, position):
+        start = 0
+        for index, instruction in enumerate(self.code):
+            if start == position:
+                return index
+            start = instruction.end
+        raise SnapshotError("No instruction starts at program position {}".format(position))
+
+    # True right before the first instruction of a loop body
+    def at_loop_start(self):
+        return self.ip > 0 and self.code[self.ip - 1].op == OPEN
 
     def start(self):
-        while not self.terminated:
-            self.step()
+        if self.print_steps or self.recorder is not None:
+            # Printed steps have to match the source program one character at a time
+            self.code = Compiler(self.program, fold=False).compile()
+        if self.prefix is not None:
+            # Only a plain run from the start makes use of the prefix, the others have to see every step
+            if self.print_steps or self.recorder is not None or self.profiler is not None or \
+                    self.resume_position is not None or self.prefix.restore(self):
+                self.prefix = None
+        if self.resume_position is not None:
+            self.ip = self.index_at(self.resume_position)
+        if self.quota is not None:
+            self.quota.start()
+        if self.snapshotter is not None:
+            self.snapshotter.install()
+        self.checkpoint()
+
+        if self.print_steps:
+            while not self.terminated:
+                if self.step_count >= self.check_at:
+                    self.checkpoint()
+                self.step()
+        elif self.recorder is not None:
+            self.trace(self.recorder)
+        elif self.profiler is not None:
+            self.profile(self.profiler)
+        else:
+            self.run()
 
     def terminate(self):
         self.terminated = True
 
-    def print_debug_info(self):
+    # Called by the loops when the step count gets to check_at, returns the next check_at. Raises
+    # quota.QuotaExceededError if the program went over its quota and takes the snapshots that are due.
+    def checkpoint(self):
+        check_at = Quota.NEVER
+        if self.quota is not None:
+            check_at = self.quota.check(self.step_count, self.output)
+        if self.snapshotter is not None:
+            check_at = min(check_at, self.snapshotter.check(self))
+        self.check_at = check_at
+        return check_at
+
+    def breakpoint(self, arg=None):
+        self.print_debug_info()
+        if self.snapshotter is not None:
+            self.snapshotter.take(self)
+
+    # What the debug output would show, for a program stopped before its end
+    def print_state(self, file):
+        print(self.output.get_debug_data(self.inp.get_debug_data(), self), file=file)
+
+    def print_debug_info(self, arg=None):
         input_debug_data = self.inp.get_debug_data()
         self.output.print_debug_data(input_debug_data, self)
 
-    def move_next_instruction(self):
-        if self.program_pointer >= len(self.program):
-            if self.test:
-                self.print_debug_info()
-            self.terminate()
-            return 'N'
-        self.program_pointer += 1
-        return self.program[self.program_pointer-1]
+    def finish(self, arg=None):
+        if self.test:
+            self.print_debug_info()
+        self.output.flush()
+        self.terminate()
 
-    def move_previous_instruction(self):
-        self.program_pointer -= 1
-        ret = self.program[self.program_pointer]
-        return ret
+    # Returns the new value of the current cell, which is current itself at the end of the input if the input source
+    # leaves the cell unchanged
+    def next_input(self, current):
+        byte = self.inp.get_next_input()
+        return current if byte is None else byte
 
     def step(self):
-        instruction = self.move_next_instruction()
+        instruction = self.code[self.ip]
+        self.ip += 1
 
-        self.step_count += 1
+        self.step_count += instruction.steps
 
         if self.print_steps:
+            symbol = 'N' if instruction.op == END else self.program[instruction.end - 1]
+            # Output of the previous step goes before this one
+            self.output.flush()
             print("S " + str(self.step_count) + " ## I " + str(self.program_pointer) + " ## MP " + str(self.pointer) + " ## MV " +
-              str(self.memory[self.pointer]) + " ## X " + str(instruction))
+              str(self.tape.data[self.head]) + " ## X " + symbol)
 
+        self.options[instruction.op](instruction.arg)
 
-        if instruction in self.options:
-            self.options[instruction]()
+    # Same as calling step() until termination, with the state kept in local variables. Saves the prefix right before
+    # the first instruction that reads input or shows the state, if it is to be saved.
+    def run(self):
+        code = self.code
+        tape = self.tape
+        memory = tape.data
+        start, end = tape.start, tape.end
+        pointer = self.head
+        ip = self.ip
+        step_count = self.step_count
+        check_at = self.check_at
+        prefix = self.prefix
 
-    def move_left(self):
-        if self.pointer != 0:
-            self.pointer -= 1
+        while True:
+            op, arg, position, steps = code[ip]
+            ip += 1
+            step_count += steps
 
-    def move_right(self):
-        self.pointer += 1
-        if self.pointer >= len(self.memory):
-            self.memory.append(0x00)
+            if op == BLOCK:
+                after, block_steps, (targets, shift, min_offset, max_offset) = arg
+                if pointer + min_offset >= start:
+                    if pointer + max_offset >= end:
+                        end = tape.grow(pointer + max_offset)
+                    for offset, change in targets:
+                        memory[pointer + offset] = (memory[pointer + offset] + change) & 0xFF
+                    pointer += shift
+                    step_count += block_steps
+                    ip = after
+            elif op == ADD:
+                memory[pointer] = (memory[pointer] + arg) & 0xFF
+            elif op == MOVE:
+                pointer += arg
+                if pointer >= end:
+                    end = tape.grow(pointer)
+                elif pointer < start:
+                    pointer = tape.grow_left(pointer)
+                    start, end = tape.start, tape.end
+            elif op == OPEN:
+                if memory[pointer] == 0x00:
+                    ip = arg + 1
+            elif op == CLOSE:
+                if memory[pointer] != 0x00:
+                    ip = arg + 1
+                    if step_count >= check_at:
+                        self.head, self.ip, self.step_count = pointer, ip, step_count
+                        check_at = self.checkpoint()
+            elif op == MULTIPLY:
+                value = memory[pointer]
+                if value == 0x00:
+                    step_count += 1
+                    ip = arg[0]
+                else:
+                    after, loop_steps, (targets, counter, min_offset, max_offset) = arg
+                    if pointer + min_offset >= start:
+                        count = value if counter == 255 else 256 - value
+                        if pointer + max_offset >= end:
+                            end = tape.grow(pointer + max_offset)
+                        for offset, change in targets:
+                            memory[pointer + offset] = (memory[pointer + offset] + count * change) & 0xFF
+                        memory[pointer] = 0x00
+                        step_count += 1 + count * loop_steps
+                        ip = after
+            elif op == CLEAR:
+                value = memory[pointer]
+                if value != 0x00:
+                    after, loop_steps, counter = arg
+                    step_count += loop_steps * (value if counter == 255 else 256 - value)
+                    memory[pointer] = 0x00
+                step_count += 1
+                ip = arg[0]
+            elif op == SCAN:
+                after, loop_steps, direction = arg
+                if direction > 0:
+                    found = memory.find(b'\x00', pointer)
+                    if found < 0:
+                        found = len(memory)
+                    if found >= end:
+                        end = tape.grow(found)
+                else:
+                    found = memory.rfind(b'\x00', start, pointer + 1)
+                if found >= 0:
+                    step_count += 1 + abs(found - pointer) * loop_steps
+                    pointer = found
+                    ip = after
+            elif op == OUT:
+                self.output.put_char(memory[pointer])
+            elif op == IN:
+                if prefix is not None:
+                    self.head, self.ip, self.step_count = pointer, ip - 1, step_count - steps
+                    prefix.store(self)
+                    prefix = None
+                memory[pointer] = self.next_input(memory[pointer])
+            else:
+                if prefix is not None:
+                    self.head, self.ip, self.step_count = pointer, ip - 1, step_count - steps
+                    prefix.store(self)
+                    prefix = None
+                self.head, self.ip, self.step_count = pointer, ip, step_count
+                self.options[op](arg)
+                if op == END:
+                    return
 
-    def increment(self):
-        temp = self.memory[self.pointer] + 1
-        self.memory[self.pointer] = temp % 256
+    # Same as printing the steps, only the records go to a recorder.TraceRecorder. Like run() it keeps the state in local
+    # variables, the code is not folded nor optimized so it has no loop idioms.
+    def trace(self, recorder):
+        code = self.code
+        tape = self.tape
+        memory = tape.data
+        start, end = tape.start, tape.end
+        pointer = self.head
+        ip = self.ip
+        step_count = self.step_count
 
-    def decrement(self):
-        if self.memory[self.pointer] == 0x00:
-            self.memory[self.pointer] = 0xFF
-        else:
-            self.memory[self.pointer] -= 1
+        symbols = [b'N' if instruction.op == END else self.program[instruction.end - 1].encode('latin-1')
+                   for instruction in code]
+        # Pointer as shown in the records is the physical one plus shift
+        shift = tape.index(0)
 
-    def out(self):
-        self.output.put_char(self.memory[self.pointer])
+        check_at = self.check_at
 
-    def read(self):
-        byte = self.inp.get_next_input()
-        self.memory[self.pointer] = byte
-
-    def open_loop(self):
-        if self.memory[self.pointer] == 0x00:
-            closed_loops_count = 1
-            while closed_loops_count > 0:
-                instr = self.move_next_instruction()
-                if instr == ']':
-                    closed_loops_count -= 1
-                elif instr == '[':
-                    closed_loops_count += 1
+        pack_into = recorder.RECORD.pack_into
+        record_size = recorder.RECORD.size
+        buffer = recorder.buffer
+        buffer_size = len(buffer)
+        offset = 0
 
-        else:
-            self.loop_stack.append(self.program_pointer)
-
-    def close_loop(self):
-        if self.memory[self.pointer] != 0x00:
-
-            if len(self.loop_stack) > 0:
-                open_loop_index = self.loop_stack[-1]
-                self.program_pointer = open_loop_index
-                return
-
-            opened_loops_count = 1
-            self.move_previous_instruction()
-            while opened_loops_count > 0:
-                instr = self.move_previous_instruction()
-                if instr == '[':
-                    opened_loops_count -= 1
-                elif instr == ']':
-                    opened_loops_count += 1
-            self.move_next_instruction()
+        try:
+            while True:
+                op, arg, position, steps = code[ip]
+                step_count += steps
+                pack_into(buffer, offset, step_count, position, pointer + shift, memory[pointer], symbols[ip])
+                offset += record_size
+                if offset == buffer_size:
+                    recorder.full()
+                    offset = 0
+                ip += 1
+
+                if op == ADD:
+                    memory[pointer] = (memory[pointer] + arg) & 0xFF
+                elif op == MOVE:
+                    pointer += arg
+                    if pointer >= end:
+                        end = tape.grow(pointer)
+                    elif pointer < start:
+                        pointer = tape.grow_left(pointer)
+                        start, end = tape.start, tape.end
+                        shift = tape.index(0)
+                elif op == OPEN:
+                    if memory[pointer] == 0x00:
+                        ip = arg + 1
+                elif op == CLOSE:
+                    if memory[pointer] != 0x00:
+                        ip = arg + 1
+                        if step_count >= check_at:
+                            self.head, self.ip, self.step_count = pointer, ip, step_count
+                            check_at = self.checkpoint()
+                elif op == OUT:
+                    self.output.put_char(memory[pointer])
+                elif op == IN:
+                    memory[pointer] = self.next_input(memory[pointer])
+                else:
+                    self.head, self.ip, self.step_count = pointer, ip, step_count
+                    self.options[op](arg)
+                    if op == END:
+                        return
+        finally:
+            # Even a program that failed leaves its trace
+            self.head, self.ip, self.step_count = pointer, ip, step_count
+            recorder.close(offset)
+
+    # Same as calling step() until termination, counting what every instruction does in a profiler.Profiler. The
+    # counting has a loop of its own, so run() doesn't pay for it.
+    def profile(self, profiler):
+        code = self.code
+        options = self.options
+        counts, steps, skipped = profiler.counts, profiler.steps, profiler.skipped
+
+        while not self.terminated:
+            if self.step_count >= self.check_at:
+                self.checkpoint()
+            ip = self.ip
+            op, arg, position, instruction_steps = code[ip]
+            before = self.step_count
+            self.ip = ip + 1
+            self.step_count += instruction_steps
+            options[op](arg)
+
+            counts[ip] += 1
+            steps[ip] += self.step_count - before
+            if (op == CLEAR or op == SCAN or op == MULTIPLY) and self.ip == arg[0]:
+                skipped[ip] += 1
+
+    def add(self, amount):
+        self.tape.data[self.head] = (self.tape.data[self.head] + amount) & 0xFF
+
+    def move(self, distance):
+        self.head += distance
+        if self.head >= self.tape.end:
+            self.tape.grow(self.head)
+        elif self.head < self.tape.start:
+            self.head = self.tape.grow_left(self.head)
 
+    def out(self, arg=None):
+        self.output.put_char(self.tape.data[self.head])
+
+    def read(self, arg=None):
+        self.tape.data[self.head] = self.next_input(self.tape.data[self.head])
+
+    def open_loop(self, jump):
+        if self.tape.data[self.head] == 0x00:
+            self.ip = jump + 1
+
+    def close_loop(self, jump):
+        if self.tape.data[self.head] != 0x00:
+            self.ip = jump + 1
+
+    # Falls through to the run itself when it would move before the first cell, which only the run can handle
+    def block(self, arg):
+        after, block_steps, (targets, shift, min_offset, max_offset) = arg
+        tape = self.tape
+        if self.head + min_offset >= tape.start:
+            if self.head + max_offset >= tape.end:
+                tape.grow(self.head + max_offset)
+            for offset, change in targets:
+                cell = self.head + offset
+                tape.data[cell] = (tape.data[cell] + change) & 0xFF
+            self.head += shift
+            self.step_count += block_steps
+            self.ip = after
+
+    # The loop idioms below fall through to the original loop when they can't be applied, see optimizer.Optimizer
+
+    def clear(self, arg):
+        after, loop_steps, counter = arg
+        value = self.tape.data[self.head]
+        if value != 0x00:
+            self.step_count += loop_steps * (value if counter == 255 else 256 - value)
+            self.tape.data[self.head] = 0x00
+        self.step_count += 1
+        self.ip = after
+
+    def scan(self, arg):
+        after, loop_steps, direction = arg
+        tape = self.tape
+        if direction > 0:
+            found = tape.data.find(b'\x00', self.head)
+            if found < 0:
+                found = len(tape.data)
+            if found >= tape.end:
+                tape.grow(found)
         else:
-            self.loop_stack.pop()
+            found = tape.data.rfind(b'\x00', tape.start, self.head + 1)
+        if found >= 0:
+            self.step_count += 1 + abs(found - self.head) * loop_steps
+            self.head = found
+            self.ip = after
+
+    def multiply(self, arg):
+        after, loop_steps, (targets, counter, min_offset, max_offset) = arg
+        tape = self.tape
+        value = tape.data[self.head]
+        if value == 0x00:
+            self.step_count += 1
+            self.ip = after
+        elif self.head + min_offset >= tape.start:
+            count = value if counter == 255 else 256 - value
+            if self.head + max_offset >= tape.end:
+                tape.grow(self.head + max_offset)
+            for offset, change in targets:
+                cell = self.head + offset
+                tape.data[cell] = (tape.data[cell] + count * change) & 0xFF
+            tape.data[self.head] = 0x00
+            self.step_count += 1 + count * loop_steps
+            self.ip = after
@@ -4,22 +4,104 @@ from png_encoder import BrainlollerEncoder, BraincopterEncoder
 __author__ = 'Daniel Maly'
 
 import argparse
+import os
 import sys
-from binterpreter import Binterpreter
-from input_source import InputSource
+from binterpreter import Binterpreter, BracketMismatchError
+from cache import ProgramCache
+from tape import Tape, PagedTape, MmapTape, TapeLimitError
+from codegen import PythonBinterpreter
+from recorder import TraceRecorder, TraceFormatError
+from profiler import Profiler
+from quota import Quota, QuotaExceededError
+from snapshot import Snapshot, Snapshotter, SnapshotError
+from prefix import Prefix
+from batch import read_jobs, run_batch
+from daemon import Daemon
+import client
+from input_source import InputSource, InputStream
 from output_receiver import OutputReceiver
 from png_decoder import PNGNotImplementedError, PNGWrongHeaderError
 
 
-def main():
+ENGINES = {
+    'interpreter': Binterpreter,
+    'python': PythonBinterpreter
+}
+
+
+TAPES = {
+    'dense': Tape,
+    'paged': PagedTape,
+    'mmap': MmapTape
+}
+
+
+def make_parser():
     parser = argparse.ArgumentParser()
 
 
     parser.add_argument("source", help="input file or brainfuck code enclosed in quotes", nargs="?")
     parser.add_argument("-t", "--test", help="print debug output at the end of execution", action="store_true")
     parser.add_argument("-s", "--steps", help="print brainfuck interpreter output at each step", action="store_true")
+    parser.add_argument("--trace", help="record every step of the program to FILE in binary form instead of "
+                                        "printing it (see --decode-trace)", metavar="FILE")
+    parser.add_argument("--trace-last", help="keep only the last N steps in the trace", metavar='N', type=int)
+    parser.add_argument("--decode-trace", help="print a trace recorded with --trace the way -s does and exit",
+                        metavar="FILE")
+    parser.add_argument("--profile", help="count the steps taken by every instruction and loop and print the "
+                                          "hottest loops to stderr at the end", action="store_true")
+    parser.add_argument("--profile-json", help="write the whole profile to FILE as JSON (implies --profile)",
+                        metavar="FILE")
     parser.add_argument("-m", "--memory", help="initial memory state", metavar="b'...'")
     parser.add_argument("-p", "--pointer", help="initial pointer location", metavar='N', type=int, default=0)
+    parser.add_argument("--bidirectional", help="let the memory grow to the left of its first cell instead of "
+                                                "stopping there", action="store_true")
+    parser.add_argument("--tape", help="memory kind: one bytearray (dense), pages allocated on the first write "
+                                       "(paged) or a memory mapped file (mmap)",
+                        choices=TAPES.keys(), default='dense')
+    parser.add_argument("--tape-file", help="file to map the memory to (mmap memory only, a temporary file by "
+                                            "default)", metavar="FILE")
+    parser.add_argument("--tape-capacity", help="number of memory cells to allocate in advance", metavar='N', type=int,
+                        default=0)
+    parser.add_argument("--tape-limit", help="maximum number of memory cells the program may use", metavar='N',
+                        type=int)
+    parser.add_argument("--max-steps", help="stop the program after about N steps (interpreter engine only)",
+                        metavar='N', type=int)
+    parser.add_argument("--max-time", help="stop the program after about SECONDS seconds", metavar='SECONDS',
+                        type=float)
+    parser.add_argument("--max-output", help="stop the program once it writes more than N bytes", metavar='N',
+                        type=int)
+    parser.add_argument("--snapshot", help="save the state of the program to FILE at every #, on SIGUSR1 and with "
+                                           "--snapshot-every (interpreter engine only)", metavar="FILE")
+    parser.add_argument("--snapshot-every", help="save the state about every N steps", metavar='N', type=int)
+    parser.add_argument("--resume", help="carry on from the state saved in FILE by --snapshot", metavar="FILE")
+    parser.add_argument("-i", "--input", help="read the input of the program from FILE instead of stdin (after the "
+                                              "input given in the source)", metavar="FILE")
+    parser.add_argument("--eof", help="value read by ',' at the end of the input: 0 (the default), 255 or the cell "
+                                      "is left unchanged (keep)", choices=InputSource.EOF_POLICIES, default='0')
+    parser.add_argument("--flush", help="when to write the output of the program: after every byte (byte), "
+                                        "after a newline or before reading input (line), before reading input "
+                                        "(input) or only once the buffer is full (full); line on a terminal and "
+                                        "input otherwise by default", choices=OutputReceiver.FLUSH_POLICIES)
+    parser.add_argument("-e", "--engine", help="execute the program step by step (interpreter) or translate it "
+                                               "to Python first (python)",
+                        choices=ENGINES.keys(), default='interpreter')
+    parser.add_argument("--dump-code", help="write the generated Python module to FILE (python engine only)",
+                        metavar="FILE")
+
+    parser.add_argument("--no-cache", help="don't use the " + ProgramCache.DIRECTORY + " cache of prepared programs",
+                        action="store_true")
+    parser.add_argument("--clear-cache", help="remove the cached programs next to the source (or in the current "
+                                              "directory) and exit", action="store_true")
+
+    parser.add_argument("--batch", help="run every program of a directory or of a manifest (lines of a program and "
+                                        "an optional input file) on a pool of processes and print their results "
+                                        "as JSON lines", metavar="PATH")
+    parser.add_argument("-j", "--jobs", help="number of processes for --batch (one per core by default)",
+                        metavar='N', type=int)
+    parser.add_argument("--lockstep", help="run the inputs of the same program together on vectorized memories "
+                                           "for --batch (interpreter engine only, needs NumPy to be any faster)",
+                        action="store_true")
 
     parser.add_argument("--lc2f", help="translate input image to regular brainfuck source",
                          metavar=('source_image', 'destination_file'), nargs='+')
@@ -30,12 +112,41 @@ def main():
     parser.add_argument("-o", "--outfile", metavar="FILE", help="Output file for --f2lc option.")
     parser.add_argument("--pnm", help="export in P6 format instead of PNG for --f2lc option", action="store_true")
 
-    args = parser.parse_args()
+    parser.add_argument("--daemon", help="serve the clients connecting to the Unix socket SOCKET (see "
+                                         "$" + client.ENVIRONMENT + ") until terminated", metavar="SOCKET")
+    parser.add_argument("--workers", help="number of worker processes of the daemon (one per core by default)",
+                        metavar='N', type=int)
+    return parser
+
+
+def main():
+    args = make_parser().parse_args()
+    if args.daemon is not None:
+        Daemon(args.daemon, run_arguments, workers=args.workers).serve()
+        sys.exit(0)
+
     dispatch(args)
     sys.exit(0)
 
 
-def dispatch(args):
+# Does what main() does with the command line arguments argv and returns the exit code, used by the daemon
+def run_arguments(argv, memory_cache=None):
+    try:
+        args = make_parser().parse_args(argv)
+        if args.daemon is not None:
+            print("A daemon can't be started through another one.", file=sys.stderr)
+            return 1
+        dispatch(args, memory_cache)
+    except SystemExit as ex:
+        if ex.code is None or isinstance(ex.code, int):
+            return ex.code or 0
+        print(ex.code, file=sys.stderr)
+        return 1
+    return 0
+
+
+# memory_cache is a cache.MemoryCache that keeps the prepared programs between calls
+def dispatch(args, memory_cache=None):
 
     src_string = args.source
     if args.lc2f is not None:
@@ -43,8 +154,45 @@ def dispatch(args):
     if args.f2lc is not None:
         src_string = args.f2lc[0]
 
+    if args.decode_trace is not None:
+        try:
+            TraceRecorder.decode(args.decode_trace, sys.stdout)
+        except TraceFormatError as ex:
+            traceback.print_exc()
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.batch is not None:
+        options = {
+            'engine': ENGINES[args.engine],
+            'tape': TAPES[args.tape],
+            'tape_limit': args.tape_limit,
+            'bidirectional': args.bidirectional,
+            'eof': args.eof,
+            'max_steps': args.max_steps,
+            'max_time': args.max_time,
+            'max_output': args.max_output,
+            'no_cache': args.no_cache,
+            'lockstep': args.lockstep
+        }
+        run_batch(read_jobs(args.batch), options, processes=args.jobs)
+        sys.exit(0)
+
+    if args.clear_cache:
+        if src_string is not None and os.path.isfile(src_string):
+            ProgramCache.for_source(src_string).clear()
+        else:
+            ProgramCache.for_directory(os.getcwd()).clear()
+        sys.exit(0)
+
+    cache = None
+    if not args.no_cache and src_string is not None and os.path.isfile(src_string):
+        cache = ProgramCache.for_source(src_string)
+    if memory_cache is not None:
+        cache = memory_cache.with_parent(cache)
+
     try:
-        source = retrieve_source(src_string, debug=args.test)
+        source = retrieve_source(src_string, debug=args.test, cache=cache)
     except PNGWrongHeaderError as ex:
         traceback.print_exc()
         sys.exit(4)
@@ -74,21 +222,99 @@ def dispatch(args):
             BraincopterEncoder(source.program, args.f2lc[1], args.outfile, format=fmt).encode()
 
     else:
-        output = OutputReceiver()
-        start_interpreter(source, output, args.memory, args.pointer, args.steps, args.test)
+        if args.dump_code is not None and args.engine != 'python':
+            print("Only the python engine generates code to dump.")
+            sys.exit(1)
+        if args.max_steps is not None and args.engine == 'python':
+            print("Only the interpreter engine counts steps.")
+            sys.exit(1)
+        if (args.snapshot is not None or args.resume is not None) and args.engine == 'python':
+            print("Only the interpreter engine takes snapshots.")
+            sys.exit(1)
+
+        source.eof = args.eof
+        if args.input is not None:
+            source.stream = InputStream.for_file(args.input)
+
+        output = OutputReceiver(flush_policy=args.flush)
+        output.limit = args.max_output
+        quota = None
+        if args.max_steps is not None or args.max_time is not None or args.max_output is not None:
+            quota = Quota(args.max_steps, args.max_time, args.max_output)
+        try:
+            tape = make_tape(args)
+            recorder = None
+            if args.trace is not None:
+                recorder = TraceRecorder.for_file(args.trace, last=args.trace_last)
+            start_interpreter(source, output, args.memory, args.pointer, args.steps, args.test,
+                              engine=args.engine, dump_code=args.dump_code, cache=cache, tape=tape,
+                              recorder=recorder, profile=args.profile or args.profile_json is not None,
+                              profile_json=args.profile_json, quota=quota, snapshot=args.snapshot,
+                              snapshot_every=args.snapshot_every, resume=args.resume)
+        except BracketMismatchError as ex:
+            traceback.print_exc()
+            sys.exit(16)
+        except TapeLimitError as ex:
+            sys.exit(32)
+        except QuotaExceededError as ex:
+            sys.exit(64)
+        except SnapshotError as ex:
+            print(ex, file=sys.stderr)
+            sys.exit(1)
+        finally:
+            # Whatever the program managed to write before it failed
+            try:
+                output.flush()
+            except QuotaExceededError:
+                pass
 
 
 
-def start_interpreter(source, output, memory, pointer, steps, test=False):
-    binterpreter = Binterpreter(input_source=source, output_receiver=output, test=test)
+def make_tape(args):
+    if args.tape == 'mmap':
+        return MmapTape(capacity=args.tape_capacity, limit=args.tape_limit, bidirectional=args.bidirectional,
+                        filename=args.tape_file)
+    return TAPES[args.tape](capacity=args.tape_capacity, limit=args.tape_limit, bidirectional=args.bidirectional)
+
+
+def start_interpreter(source, output, memory, pointer, steps, test=False, engine='interpreter', dump_code=None,
+                      cache=None, tape=None, recorder=None, profile=False, profile_json=None, quota=None,
+                      snapshot=None, snapshot_every=None, resume=None):
+    binterpreter = ENGINES[engine](input_source=source, output_receiver=output, test=test, cache=cache, tape=tape)
     if memory is not None and len(memory) > 0:
         binterpreter.initialize_memory(memory_bytes_from_string(memory))
+    elif cache is not None and pointer == 0 and engine == 'interpreter':
+        binterpreter.prefix = Prefix(cache)
     binterpreter.initialize_pointer(pointer)
 
     if steps:
         binterpreter.print_steps = True
+    binterpreter.quota = quota
+    if snapshot is not None:
+        binterpreter.snapshotter = Snapshotter(snapshot, snapshot_every)
+    if resume is not None:
+        Snapshot.read(resume).restore(binterpreter)
+    # Traces and profiles are recorded by the interpreter whatever the engine
+    binterpreter.recorder = recorder
+    if profile:
+        binterpreter.profiler = Profiler(binterpreter.code, binterpreter.program)
+    if dump_code is not None:
+        binterpreter.dump_code(dump_code)
 
-    binterpreter.start()
+    try:
+        binterpreter.start()
+    except QuotaExceededError as ex:
+        # The output so far is written by the caller, the state goes to stderr
+        print(ex, file=sys.stderr)
+        binterpreter.print_state(sys.stderr)
+        raise
+    finally:
+        # A program that failed gets its profile as well
+        if binterpreter.profiler is not None:
+            output.flush()
+            binterpreter.profiler.print_report(sys.stderr)
+            if profile_json is not None:
+                binterpreter.profiler.write_json(profile_json)
 
 
 def memory_bytes_from_string(st):
@@ -100,7 +326,7 @@ def memory_bytes_from_string(st):
     return [ord(x) for x in s]
 
 
-def retrieve_source(source, debug=False):
+def retrieve_source(source, debug=False, cache=None):
     if source is not None:
         if set(source).issubset(set("[]-+<>#.,\"")):
             if "\"" in source:
@@ -108,9 +334,9 @@ def retrieve_source(source, debug=False):
             return InputSource.for_input_string(source, debug=debug)
         else:
             try:
-                return InputSource.for_file(source, debug=debug)
+                return InputSource.for_file(source, debug=debug, cache=cache)
             except UnicodeDecodeError as ex:
-                return InputSource.for_image_file(source, debug=debug)
+                return InputSource.for_image_file(source, debug=debug, cache=cache)
     else:
         #Interpreter mode
         return InputSource.for_interactive_string(debug=debug)
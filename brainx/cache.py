@@ -0,0 +1,155 @@
+__author__ = 'Daniel Maly'
+
+import collections
+import hashlib
+import marshal
+import os
+import sys
+
+
+# Persistent cache of prepared programs, stored in a __brainxcache__ directory next to the program (much like
+# __pycache__). Entries are keyed by a hash of the data they were made from, the kind of the entry, the cache version
+# and the Python version, and are stored with marshal. The least recently used entries are removed once the cache
+# grows over max_size bytes.
+class ProgramCache:
+    DIRECTORY = '__brainxcache__'
+    SUFFIX = '.bxc'
+
+    # Has to be raised whenever the compiler, the optimizer or the code generator start producing something else
+    VERSION = 5
+
+    MAX_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, directory, max_size=MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    @classmethod
+    def for_directory(cls, directory, max_size=MAX_SIZE):
+        return cls(os.path.join(directory, cls.DIRECTORY), max_size)
+
+    @classmethod
+    def for_source(cls, filename, max_size=MAX_SIZE):
+        return cls.for_directory(os.path.dirname(os.path.abspath(filename)), max_size)
+
+    def path(self, data, kind):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        name = "{}.{}.{}.{}{}".format(digest, kind, self.VERSION, sys.implementation.cache_tag, self.SUFFIX)
+        return os.path.join(self.directory, name)
+
+    def load(self, data, kind):
+        path = self.path(data, kind)
+        try:
+            with open(path, 'rb') as file:
+                value = marshal.loads(file.read())
+            # Remember the use for the eviction
+            os.utime(path)
+            return value
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def store(self, data, kind, value):
+        path = self.path(data, kind)
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary, 'wb') as file:
+                file.write(marshal.dumps(value))
+            os.replace(temporary, path)
+        except OSError:
+            # A read-only or otherwise unusable cache directory just means no caching
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def entries(self):
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+
+        for name in names:
+            if name.endswith(self.SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Cache of prepared programs kept in memory by processes that run many of them (see batch), with the same interface
+# as ProgramCache. Only the max_entries most recently used entries are kept. Missing entries are looked up in the
+# parent cache (a ProgramCache, usually) if there is one.
+class MemoryCache:
+    MAX_ENTRIES = 256
+
+    def __init__(self, max_entries=MAX_ENTRIES, parent=None):
+        self.max_entries = max_entries
+        self.parent = parent
+        self.entries = collections.OrderedDict()
+
+    # The same entries with another parent
+    def with_parent(self, parent):
+        cache = MemoryCache(self.max_entries, parent)
+        cache.entries = self.entries
+        return cache
+
+    @staticmethod
+    def key(data, kind):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return hashlib.sha256(data).digest(), kind
+
+    def load(self, data, kind):
+        key = self.key(data, kind)
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            return value
+
+        if self.parent is not None:
+            value = self.parent.load(data, kind)
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def store(self, data, kind, value):
+        self.put(self.key(data, kind), value)
+        if self.parent is not None:
+            self.parent.store(data, kind, value)
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,53 @@
+__author__ = 'Daniel Maly'
+
+import json
+import os
+import signal
+import socket
+import struct
+
+# Only the standard library, starting the client has to be fast
+
+ENVIRONMENT = 'BRAINX_SOCKET'
+
+HEADER = struct.Struct('<I')
+NUMBER = struct.Struct('<i')
+
+
+def receive_exactly(connection, size):
+    data = b''
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return data
+
+
+# Sends the command line argv to the daemon listening on path (see daemon.Daemon) and returns the exit code, or None
+# if there is no daemon to send it to. The program reads and writes the streams fds of the client directly.
+def run(path, argv, fds=(0, 1, 2)):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        return None
+
+    with connection:
+        request = json.dumps({'argv': argv, 'cwd': os.getcwd()}).encode('utf-8')
+        socket.send_fds(connection, [HEADER.pack(len(request)) + request], list(fds))
+        try:
+            pid, = NUMBER.unpack(receive_exactly(connection, NUMBER.size))
+        except ConnectionError:
+            return None
+
+        while True:
+            try:
+                code, = NUMBER.unpack(receive_exactly(connection, NUMBER.size))
+                return code
+            except KeyboardInterrupt:
+                # The program runs in the worker, which is interrupted instead
+                os.kill(pid, signal.SIGINT)
+            except ConnectionError:
+                return 1
@@ -0,0 +1,262 @@
+__author__ = 'Daniel Maly'
+
+from binterpreter import Binterpreter
+from compiler import ADD, MOVE, OUT, IN, OPEN, DEBUG, CLEAR, SCAN, MULTIPLY, BLOCK
+
+
+# Translates a compiled (and optimized) program into the source of a Python module.
+#
+# The module defines a function run(tape, p) which executes the program on the bytearray tape (the data of
+# a tape.Tape) from the position p and returns the final position. It expects the following names to be defined
+# before the module is executed:
+#   t           the tape.Tape itself
+#   put(value)  output a byte
+#   get(value)  return the next input byte, value at the end of the input if the cell is to be left unchanged
+#   debug(p)    print debug information at the position p
+class PythonCodeGenerator:
+
+    INDENT = '    '
+
+    # Python refuses too many nested blocks in one function, deeper loops get functions of their own
+    MAX_DEPTH = 16
+    # Compiling huge functions is slow and memory hungry, long stretches of code are split into parts
+    MAX_BLOCK = 1000
+
+    HEADER = "def {}(tape, p, t=t, put=put, get=get, debug=debug):"
+
+    def __init__(self, code):
+        self.code = code
+        self.functions = []
+
+    # Returns the source of every generated function separately, compiling them one by one needs much less memory
+    # than compiling the whole module at once
+    def generate(self):
+        self.functions = []
+        # The last instruction is END, which is left to the caller
+        self.add_function('run', 0, len(self.code) - 1)
+        return ["\n".join(function) + "\n" for function in self.functions]
+
+    def add_function(self, name, start, stop):
+        lines = [self.HEADER.format(name)]
+        self.functions.append(lines)
+        self.emit(start, stop, 1, lines)
+        lines.append(self.INDENT + "return p")
+        return name
+
+    def emit(self, start, stop, depth, lines):
+        if stop - start <= self.MAX_BLOCK:
+            self.emit_block(start, stop, depth, lines)
+            return
+
+        pad = self.INDENT * depth
+        for part_start, part_stop in self.parts(start, stop):
+            if part_stop - part_start > self.MAX_BLOCK:
+                # A single long loop, its body is split instead
+                self.emit_block(part_start, part_stop, depth, lines)
+            else:
+                name = "part_{}".format(len(self.functions))
+                lines.append(pad + "p = {}(tape, p)".format(name))
+                self.add_function(name, part_start, part_stop)
+
+    # Splits code[start:stop] into parts of at most MAX_BLOCK instructions without cutting through loops
+    def parts(self, start, stop):
+        code = self.code
+        part_start = start
+        index = start
+
+        while index < stop:
+            op, arg = code[index].op, code[index].arg
+            if op == OPEN:
+                item_stop = arg + 1
+            elif op == CLEAR or op == SCAN or op == MULTIPLY or op == BLOCK:
+                item_stop = arg[0]
+            else:
+                item_stop = index + 1
+
+            if item_stop - index > self.MAX_BLOCK:
+                if part_start < index:
+                    yield part_start, index
+                yield index, item_stop
+                part_start = item_stop
+            elif item_stop - part_start > self.MAX_BLOCK:
+                yield part_start, index
+                part_start = index
+            index = item_stop
+
+        if part_start < stop:
+            yield part_start, stop
+
+    def emit_block(self, start, stop, depth, lines):
+        code = self.code
+        pad = self.INDENT * depth
+        index = start
+
+        while index < stop:
+            op, arg, end, steps = code[index]
+
+            if op == ADD:
+                lines.append(pad + "tape[p] = (tape[p] + {}) & 255".format(arg))
+            elif op == MOVE:
+                lines.append(pad + "p += {}".format(arg))
+                if arg > 0:
+                    lines.append(pad + "if p >= t.end:")
+                    lines.append(pad + self.INDENT + "t.grow(p)")
+                else:
+                    lines.append(pad + "if p < t.start:")
+                    lines.append(pad + self.INDENT + "p = t.grow_left(p)")
+            elif op == OUT:
+                lines.append(pad + "put(tape[p])")
+            elif op == IN:
+                lines.append(pad + "tape[p] = get(tape[p])")
+            elif op == DEBUG:
+                lines.append(pad + "debug(p)")
+            elif op == OPEN:
+                self.emit_loop(index, depth, lines)
+                index = arg
+            elif op == CLEAR or op == SCAN or op == MULTIPLY:
+                if self.emit_idiom(op, arg, depth, lines):
+                    # The idiom always replaces the whole loop
+                    index = arg[0] - 1
+            elif op == BLOCK:
+                self.emit_straight(index, depth, lines)
+                index = arg[0] - 1
+            index += 1
+
+    def emit_loop(self, index, depth, lines):
+        pad = self.INDENT * depth
+        close = self.code[index].arg
+
+        if depth >= self.MAX_DEPTH:
+            name = "loop_{}".format(len(self.functions))
+            lines.append(pad + "p = {}(tape, p)".format(name))
+            self.add_function(name, index, close + 1)
+            return
+
+        lines.append(pad + "while tape[p]:")
+        body_start = len(lines)
+        self.emit(index + 1, close, depth + 1, lines)
+        if len(lines) == body_start:
+            lines.append(pad + self.INDENT + "pass")
+
+    # Cells of a straight run are changed at their offsets and the pointer moves once, a run that may move before the
+    # first cell is kept as it is for that case
+    def emit_straight(self, index, depth, lines):
+        pad = self.INDENT * depth
+        after, steps, (targets, shift, min_offset, max_offset) = self.code[index].arg
+
+        if min_offset < 0:
+            lines.append(pad + "if p >= t.start + {}:".format(-min_offset))
+            pad += self.INDENT
+        body_start = len(lines)
+        if max_offset > 0:
+            lines.append(pad + "if p + {} >= t.end:".format(max_offset))
+            lines.append(pad + self.INDENT + "t.grow(p + {})".format(max_offset))
+        for offset, change in targets:
+            if offset == 0:
+                cell = "tape[p]"
+            else:
+                cell = "tape[p + {}]".format(offset) if offset > 0 else "tape[p - {}]".format(-offset)
+            lines.append(pad + "{} = ({} + {}) & 255".format(cell, cell, change))
+        if shift != 0:
+            lines.append(pad + "p += {}".format(shift))
+
+        if min_offset < 0:
+            if len(lines) == body_start:
+                lines.append(pad + "pass")
+            lines.append(self.INDENT * depth + "else:")
+            self.emit_block(index + 1, after, depth + 1, lines)
+
+    # Returns True if the loop following the idiom is not needed at all
+    def emit_idiom(self, op, arg, depth, lines):
+        pad = self.INDENT * depth
+        inner = pad + self.INDENT
+        after, loop_steps, data = arg
+
+        if op == CLEAR:
+            lines.append(pad + "tape[p] = 0")
+            return True
+
+        if op == SCAN:
+            if data > 0:
+                lines.append(pad + "p = tape.find(b'\\x00', p)")
+                lines.append(pad + "if p < 0:")
+                lines.append(inner + "p = len(tape)")
+                lines.append(pad + "if p >= t.end:")
+                lines.append(inner + "t.grow(p)")
+                return True
+            # Without a zero cell on the left the loop never ends, which is left to the loop itself
+            lines.append(pad + "found = tape.rfind(b'\\x00', t.start, p + 1)")
+            lines.append(pad + "if found >= 0:")
+            lines.append(inner + "p = found")
+            return False
+
+        targets, counter, min_offset, max_offset = data
+        if min_offset < 0:
+            lines.append(pad + "if tape[p] and p >= t.start + {}:".format(-min_offset))
+        else:
+            lines.append(pad + "if tape[p]:")
+        if max_offset > 0:
+            lines.append(inner + "if p + {} >= t.end:".format(max_offset))
+            lines.append(inner + self.INDENT + "t.grow(p + {})".format(max_offset))
+        if counter == 255:
+            lines.append(inner + "count = tape[p]")
+        else:
+            lines.append(inner + "count = 256 - tape[p]")
+        for offset, change in targets:
+            cell = "tape[p + {}]".format(offset) if offset > 0 else "tape[p - {}]".format(-offset)
+            product = "count" if change == 1 else "count * {}".format(change)
+            lines.append(inner + "{} = ({} + {}) & 255".format(cell, cell, product))
+        lines.append(inner + "tape[p] = 0")
+        # The loop is still needed when the transfer would run into the left end of the memory
+        return min_offset >= 0
+
+
+class PythonBinterpreter(Binterpreter):
+    def __init__(self, input_source, output_receiver, test=False, cache=None, tape=None):
+        super().__init__(input_source, output_receiver, test, cache, tape)
+        self.source = None
+
+    def generate(self):
+        if self.source is None:
+            self.source = PythonCodeGenerator(self.code).generate()
+        return self.source
+
+    def compile_functions(self):
+        if self.cache is not None:
+            functions = self.cache.load(self.program, 'python')
+            if functions is not None:
+                return functions
+
+        functions = [compile(function, "<brainx>", "exec") for function in self.generate()]
+        if self.cache is not None:
+            self.cache.store(self.program, 'python', functions)
+        return functions
+
+    def dump_code(self, filename):
+        with open(filename, 'w') as file:
+            file.write("\n\n".join(self.generate()))
+
+    def run(self):
+        namespace = {
+            't': self.tape,
+            'put': self.output.put_char,
+            'get': self.next_input,
+            'debug': self.debug_at
+        }
+        for function in self.compile_functions():
+            exec(function, namespace)
+
+        # The generated code counts no steps, only the time can be limited
+        if self.quota is not None:
+            self.quota.start_timer()
+        try:
+            self.head = namespace['run'](self.tape.data, self.head)
+        finally:
+            if self.quota is not None:
+                self.quota.stop_timer()
+        self.ip = len(self.code)
+        self.finish()
+
+    def debug_at(self, head):
+        self.head = head
+        self.print_debug_info()
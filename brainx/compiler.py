@@ -0,0 +1,90 @@
+__author__ = 'Daniel Maly'
+
+import re
+from collections import namedtuple
+
+# Opcodes of the compiled program
+ADD = 0
+MOVE = 1
+OUT = 2
+IN = 3
+OPEN = 4
+CLOSE = 5
+DEBUG = 6
+END = 7
+# Loop idioms, see optimizer.Optimizer
+CLEAR = 8
+SCAN = 9
+MULTIPLY = 10
+# Straight runs of + - < >, see optimizer.Optimizer
+BLOCK = 11
+
+# op: one of the opcodes above
+# arg: amount for ADD, distance for MOVE, index of the matching bracket for OPEN and CLOSE,
+#      see optimizer.Optimizer for the loop idioms
+# end: program position right after the last source character of the instruction
+# steps: number of source instructions folded into this one
+Instruction = namedtuple('Instruction', ['op', 'arg', 'end', 'steps'])
+
+
+class BracketMismatchError(BaseException):
+    def __init__(self, position):
+        super().__init__("Unmatched bracket at program position {}".format(position))
+        self.position = position
+
+
+class Compiler:
+
+    SIMPLE_OPS = {
+        '.': OUT,
+        ',': IN,
+        '#': DEBUG
+    }
+
+    # Runs of opposite moves are not folded together, because moving left stops at the first cell
+    FOLDED_TOKENS = re.compile(r"[+\-]+|>+|<+|[^+\-<>]")
+    SINGLE_TOKENS = re.compile(r".", re.DOTALL)
+
+    def __init__(self, program, fold=True):
+        self.program = program
+        self.fold = fold
+
+    def compile(self):
+        code = []
+        opened = []
+        tokens = self.FOLDED_TOKENS if self.fold else self.SINGLE_TOKENS
+
+        for match in tokens.finditer(self.program):
+            token = match.group()
+            instruction = token[0]
+            end = match.end()
+
+            if instruction == '+' or instruction == '-':
+                amount = 2 * token.count('+') - len(token)
+                code.append(Instruction(ADD, amount % 256, end, len(token)))
+
+            elif instruction == '>':
+                code.append(Instruction(MOVE, len(token), end, len(token)))
+
+            elif instruction == '<':
+                code.append(Instruction(MOVE, -len(token), end, len(token)))
+
+            elif instruction == '[':
+                opened.append((len(code), match.start()))
+                code.append(Instruction(OPEN, None, end, 1))
+
+            elif instruction == ']':
+                if len(opened) == 0:
+                    raise BracketMismatchError(match.start())
+                open_index, _ = opened.pop()
+                code[open_index] = code[open_index]._replace(arg=len(code))
+                code.append(Instruction(CLOSE, open_index, end, 1))
+
+            elif instruction in self.SIMPLE_OPS:
+                code.append(Instruction(self.SIMPLE_OPS[instruction], None, end, 1))
+
+        if len(opened) > 0:
+            raise BracketMismatchError(opened[-1][1])
+
+        code.append(Instruction(END, None, len(self.program), 1))
+        return code
@@ -0,0 +1,122 @@
+__author__ = 'Daniel Maly'
+
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+from cache import MemoryCache
+from client import HEADER, NUMBER, receive_exactly
+
+
+# Long running server on a Unix socket, answering requests of client.run with a pool of workers forked in advance.
+#
+# A request is the command line of a client together with its working directory and its stdin, stdout and stderr
+# (the file descriptors themselves are passed through the socket). The worker answers with its pid, so the client can
+# interrupt it, then handles the request by calling handler(argv, cache) with the streams of the client in place of
+# its own and answers with the exit code handler returned. Every worker keeps the programs it prepared in cache,
+# a cache.MemoryCache, so a program sent again is neither parsed nor compiled (nor decoded, for an image).
+class Daemon:
+    def __init__(self, path, handler, workers=None, max_entries=MemoryCache.MAX_ENTRIES):
+        self.path = path
+        self.handler = handler
+        self.workers = workers or os.cpu_count() or 1
+        self.max_entries = max_entries
+        self.socket = None
+
+    def serve(self):
+        # Installed before the socket appears, a client (or a test) may terminate the daemon as soon as it sees it
+        signal.signal(signal.SIGTERM, self.terminate)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(self.path)
+        self.socket.listen(64)
+
+        children = set()
+        try:
+            for _ in range(self.workers):
+                self.fork_worker(children)
+            while True:
+                # A worker that died is replaced
+                pid, status = os.wait()
+                if pid in children:
+                    children.remove(pid)
+                    self.fork_worker(children)
+        finally:
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            self.socket.close()
+            os.remove(self.path)
+
+    def terminate(self, signum, frame):
+        sys.exit(0)
+
+    # SIGTERM waits until the new worker is among the children, otherwise the daemon could terminate without it
+    def fork_worker(self, children):
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+        try:
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+                try:
+                    self.work()
+                finally:
+                    os._exit(0)
+            children.add(pid)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+
+    def work(self):
+        cache = MemoryCache(self.max_entries)
+        while True:
+            connection, _ = self.socket.accept()
+            with connection:
+                try:
+                    self.handle(connection, cache)
+                except ConnectionError:
+                    pass
+
+    def handle(self, connection, cache):
+        data, fds, _, _ = socket.recv_fds(connection, 65536, 3)
+        if len(data) < HEADER.size or len(fds) != 3:
+            for fd in fds:
+                os.close(fd)
+            return
+        size, = HEADER.unpack(data[:HEADER.size])
+        data = data[HEADER.size:]
+        data += receive_exactly(connection, size - len(data))
+        request = json.loads(data.decode('utf-8'))
+
+        connection.sendall(NUMBER.pack(os.getpid()))
+        code = self.run(request, fds, cache)
+        connection.sendall(NUMBER.pack(code))
+
+    def run(self, request, fds, cache):
+        streams = sys.stdin, sys.stdout, sys.stderr
+        directory = os.getcwd()
+        sys.stdin = open(fds[0], 'r')
+        sys.stdout = open(fds[1], 'w', buffering=1 if os.isatty(fds[1]) else -1)
+        sys.stderr = open(fds[2], 'w', buffering=1)
+        try:
+            os.chdir(request['cwd'])
+            return self.handler(request['argv'], cache)
+        except KeyboardInterrupt:
+            # Sent by the client
+            return 130
+        except BaseException:
+            traceback.print_exc()
+            return 1
+        finally:
+            for stream in (sys.stdin, sys.stdout, sys.stderr):
+                try:
+                    stream.close()
+                except (OSError, ValueError):
+                    pass
+            sys.stdin, sys.stdout, sys.stderr = streams
+            os.chdir(directory)
@@ -1,5 +1,6 @@
 __author__ = 'Daniel Maly'
 
+import mmap
 import re
 import sys
 import png_decoder
@@ -11,20 +12,41 @@ class InputSource:
     VALID_CHARACTERS = ['<', '>', '.', ',', '+', '-', '[', ']']
 
     @classmethod
-    def for_file(cls, filename, debug=False):
+    def for_file(cls, filename, debug=False, cache=None):
         inp = None
         with open(filename, 'r') as file:
             inp = file.read()
-        return cls.for_input_string(inp, debug)
+
+        if cache is not None:
+            entry = cache.load(inp, 'source')
+            if entry is not None:
+                return cls(entry[0], entry[1], debug)
+
+        source = cls.for_input_string(inp, debug)
+        if cache is not None:
+            cache.store(inp, 'source', (source.program, source.input))
+        return source
 
     @classmethod
-    def for_image_file(cls, filename, debug=False):
+    def for_image_file(cls, filename, debug=False, cache=None):
+        # Debug output needs the pixels, so only the program of an image can be cached
+        if cache is not None and not debug:
+            with open(filename, 'rb') as file:
+                data = file.read()
+            program = cache.load(data, 'image')
+            if program is not None:
+                return InputSource(program, "", debug)
+
         decoder = png_decoder.PNGDecoder(filename)
         decoder.decode()
         if decoder.is_brainloller():
-            return BrainlollerInputSource(decoder, debug)
+            source = BrainlollerInputSource(decoder, debug)
         else:
-            return BraincopterInputSource(decoder, debug)
+            source = BraincopterInputSource(decoder, debug)
+
+        if cache is not None and not debug:
+            cache.store(data, 'image', source.program)
+        return source
 
     @classmethod
     def for_input_string(cls, string, debug=False):
@@ -38,19 +60,31 @@ class InputSource:
 
     @classmethod
     def for_interactive_string(cls, debug=False):
-        return cls.for_input_string(sys.stdin.readline())
+        # The input of the program is read from the binary stdin as well, the text layer would keep some of it
+        return cls.for_input_string(sys.stdin.buffer.readline().decode('utf-8'))
+
+    EOF_POLICIES = ('0', '255', 'keep')
 
     def __init__(self, program, inp, debug=False):
         self.program = program
         self.input = inp
         self.input_pointer = 0
         self.debug = debug
+        # Where the input continues after the part given in the source, stdin by default
+        self.stream = None
+        # What reading past the end of the input gives: '0', '255' or 'keep' (the cell is left unchanged)
+        self.eof = '0'
+        # Called before waiting for more input
+        self.before_read = None
 
     def get_next_input(self):
         if self.input_pointer >= len(self.input):
-            # print("Waiting for input now")
-            r = ord(sys.stdin.read(1))
-            return r
+            if self.stream is None:
+                self.stream = InputStream.for_stdin()
+            byte = self.stream.read_byte(self.before_read)
+            if byte is None and self.eof != 'keep':
+                return int(self.eof)
+            return byte
 
         ret = self.input[self.input_pointer]
         self.input_pointer += 1
@@ -69,6 +103,66 @@ class InputSource:
         print(self.program)
 
 
+# Binary input read in large chunks, from stdin or from a memory mapped file
+class InputStream:
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, read=None, chunk=b''):
+        self.read = read
+        self.chunk = chunk
+        self.position = 0
+        # Bytes read before the current chunk
+        self.offset = 0
+
+    @classmethod
+    def for_stdin(cls):
+        stream = sys.stdin.buffer
+        # read1() returns whatever is available, so an interactive program gets every line as soon as it is typed
+        return cls(getattr(stream, 'read1', stream.read))
+
+    @classmethod
+    def for_file(cls, filename):
+        with open(filename, 'rb') as file:
+            try:
+                # The map stays valid after the file is closed
+                return cls(chunk=mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            except ValueError:
+                # An empty file can't be mapped
+                return cls()
+
+    # Returns the next byte or None at the end of the input, before_read is called when the stream has to wait for more
+    def read_byte(self, before_read=None):
+        if self.position >= len(self.chunk):
+            if self.read is None:
+                return None
+            if before_read is not None:
+                before_read()
+            self.offset += len(self.chunk)
+            self.chunk = self.read(self.CHUNK_SIZE)
+            self.position = 0
+            if not self.chunk:
+                self.read = None
+                return None
+
+        byte = self.chunk[self.position]
+        self.position += 1
+        return byte
+
+    # Number of bytes read so far
+    def consumed(self):
+        return self.offset + self.position
+
+    def skip(self, count):
+        while count > 0:
+            step = min(count, len(self.chunk) - self.position)
+            self.position += step
+            count -= step
+            if count > 0:
+                if self.read_byte() is None:
+                    return
+                count -= 1
+
+
 #Base class for PNG sources
 class PNGInputSource(InputSource):
 
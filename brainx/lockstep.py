@@ -0,0 +1,442 @@
+__author__ = 'Daniel Maly'
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from binterpreter import Binterpreter
+from cache import MemoryCache
+from compiler import ADD, MOVE, OUT, IN, OPEN, CLOSE, DEBUG, END, CLEAR, SCAN, MULTIPLY, BLOCK
+from input_source import InputSource, InputStream
+from output_receiver import OutputReceiver
+from quota import Quota, QuotaExceededError
+
+
+# Result of one input of a Lockstep run. error is the exception the run stopped with, None if it got to the end.
+class Lane:
+    def __init__(self, inp):
+        self.input = inp
+        self.output = OutputReceiver('full')
+        self.output.print_to_stdout = False
+        self.step_count = 0
+        self.memory = b'\x00'
+        self.pointer = 0
+        self.error = None
+
+
+# Runs one program against many inputs at once. Every input has a lane: its own memory, pointer, step count, input
+# and output, but all the lanes execute the same instruction of the optimized code together, so every instruction is
+# decoded once and executed by a few NumPy operations on all the lanes instead of once per lane. The results are the
+# same as those of separate Binterpreter runs, step counts and quota errors included.
+#
+# The memories are the rows of one bytearray (width cells each) viewed as a NumPy array, so the cells can be read and
+# written for all the lanes by fancy indexing while scans still use bytearray.find. Only the non-bidirectional dense
+# memory without a cell limit is supported, batch.run_group leaves the other options to separate runs.
+#
+# When the lanes disagree on a jump (a loop that some of them enter and some not, a loop idiom or block that can't be
+# applied to some of them), the lanes going forward are parked at the index they jump to and the others carry on.
+# Lanes only ever jump forward past the code of the loop they are in, so the parked lanes form a stack by that index
+# and rejoin the others as soon as these get there. Lanes are taken out and finished one by one by a Binterpreter
+# started from their state when only FEW of them are left running, when they get to '#' (debug output is written
+# one run after another) and when they move so far right that the memories would take more than MAX_CELLS. Without
+# NumPy all the lanes are run like that from the start.
+class Lockstep:
+    FEW = 8
+    MIN_WIDTH = 256
+    MAX_CELLS = 1 << 26
+
+    def __init__(self, source, inputs, cache=None, quota=None):
+        self.source = source
+        self.cache = cache if cache is not None else MemoryCache()
+        self.quota = quota
+        self.lanes = [Lane(inp) for inp in inputs]
+        # prefix.Prefix to start the lanes from
+        self.prefix = None
+        self.template = Binterpreter(self.lane_source(), OutputReceiver('full'), cache=self.cache)
+        self.template.output.print_to_stdout = False
+        self.code = self.template.code
+
+    def lane_source(self):
+        source = InputSource(self.source.program, self.source.input)
+        source.eof = self.source.eof
+        return source
+
+    def start(self):
+        # Everything before the first instruction is the same for all the lanes
+        template = self.template
+        template.quota = self.quota
+        try:
+            if self.prefix is not None and self.prefix.restore(template):
+                template.ip = template.index_at(template.resume_position)
+            if self.quota is not None:
+                self.quota.start()
+            check_at = template.checkpoint()
+        except QuotaExceededError as ex:
+            for lane in self.lanes:
+                lane.output.put_bytes(template.output.output)
+                lane.step_count, lane.memory, lane.pointer = template.step_count, template.memory, template.pointer
+                lane.error = ex
+            return
+
+        for lane in self.lanes:
+            lane.output.put_bytes(template.output.output)
+        memory = template.memory
+        count = len(self.lanes)
+        # Embedded input beyond latin-1 is an error of every run, which is left to the runs themselves
+        if numpy is None or count <= self.FEW or any(ord(char) > 0xFF for char in self.source.input):
+            for lane in self.lanes:
+                self.finish(lane, memory, template.pointer, template.ip, template.step_count, 0, check_at)
+            return
+
+        self.width = max(self.MIN_WIDTH, 2 * len(memory))
+        self.max_width = max(self.MAX_CELLS // count, self.width)
+        self.store = bytearray(count * self.width)
+        self.flat = numpy.frombuffer(self.store, dtype=numpy.uint8)
+        self.flat.reshape(count, self.width)[:, :len(memory)] = numpy.frombuffer(memory, dtype=numpy.uint8)
+
+        # State of all the lanes, the pointers and the last used cells are relative to the rows
+        self.pointers = numpy.full(count, template.pointer, dtype=numpy.int64)
+        self.lasts = numpy.full(count, len(memory) - 1, dtype=numpy.int64)
+        self.step_counts = numpy.full(count, template.step_count, dtype=numpy.int64)
+        self.consumed = numpy.zeros(count, dtype=numpy.int64)
+        self.check_ats = numpy.full(count, check_at, dtype=numpy.int64)
+
+        # Input of the lane i is inputs[offsets[i]:offsets[i] + lengths[i]], the input in the program included
+        embedded = self.source.input.encode('latin-1')
+        inputs = [embedded + lane.input for lane in self.lanes]
+        self.lengths = numpy.array([len(inp) for inp in inputs], dtype=numpy.int64)
+        self.offsets = numpy.zeros(count, dtype=numpy.int64)
+        numpy.cumsum(self.lengths[:-1], out=self.offsets[1:])
+        # The extra byte is read (and thrown away) by the lanes at the end of their input
+        self.inputs = numpy.frombuffer(b''.join(inputs) + b'\x00', dtype=numpy.uint8)
+        eof = self.source.eof
+        self.eof = None if eof == 'keep' else int(eof)
+
+        # Output written by OUT as pairs (lanes, values), moved to the lanes by flush()
+        self.written = []
+        # Parked lanes as pairs (index, lanes), the innermost last
+        self.parked = []
+        self.merge_at = -1
+        self.active = numpy.arange(count)
+        self.load()
+        self.run(template.ip)
+        self.flush()
+
+    # Takes the state of the active lanes out of the arrays of all the lanes. The state of an active lane is the
+    # absolute index of its current cell in flat (cell), of its last used cell (last) and of its row (base), the
+    # step count (step_counts, not counting pending), the input consumed and the step count of the next checkpoint.
+    def load(self):
+        active = self.active
+        self.count = len(active)
+        self.base = active * self.width
+        self.cell = self.base + self.pointers[active]
+        self.last = self.base + self.lasts[active]
+        self.steps = self.step_counts[active]
+        self.pending = 0
+        self.read = self.consumed[active]
+        self.check = self.check_ats[active]
+        self.input_offsets = self.offsets[active]
+        self.input_lengths = self.lengths[active]
+        # Upper bound of the pointers of the active lanes
+        self.top = int((self.cell - self.base).max()) if self.count else 0
+
+    def save(self):
+        active = self.active
+        self.pointers[active] = self.cell - self.base
+        self.lasts[active] = self.last - self.base
+        self.step_counts[active] = self.steps + self.pending
+        self.consumed[active] = self.read
+        self.check_ats[active] = self.check
+
+    # Parks the active lanes selected by mask at index
+    def park(self, mask, index):
+        self.save()
+        lanes = self.active[mask]
+        if self.parked and self.parked[-1][0] == index:
+            lanes = numpy.concatenate((self.parked[-1][1], lanes))
+            self.parked.pop()
+        self.parked.append((index, lanes))
+        self.merge_at = index
+        self.active = self.active[~mask]
+        self.load()
+
+    # Brings back the lanes parked at the top of the stack, returns their index
+    def unpark(self):
+        self.save()
+        index, lanes = self.parked.pop()
+        self.active = numpy.concatenate((self.active, lanes))
+        self.merge_at = self.parked[-1][0] if self.parked else -1
+        self.load()
+        return index
+
+    # Leaves out the active lanes selected by mask, which are done
+    def retire(self, mask):
+        self.save()
+        for lane in self.active[mask].tolist():
+            self.lanes[lane].step_count = int(self.step_counts[lane])
+            self.lanes[lane].memory = self.row(lane)
+            self.lanes[lane].pointer = int(self.pointers[lane])
+        self.active = self.active[~mask]
+        self.load()
+
+    # Finishes the active lanes selected by mask one by one, starting from the instruction at index
+    def detach(self, mask, index):
+        self.save()
+        self.flush()
+        for lane in self.active[mask].tolist():
+            self.finish(self.lanes[lane], self.row(lane), int(self.pointers[lane]), index,
+                        int(self.step_counts[lane]), int(self.consumed[lane]), int(self.check_ats[lane]))
+        self.active = self.active[~mask]
+        self.load()
+
+    def row(self, lane):
+        base = lane * self.width
+        return bytes(self.store[base:base + int(self.lasts[lane]) + 1])
+
+    # Runs a lane on its own from the given state to the end
+    def finish(self, lane, memory, pointer, index, step_count, consumed, check_at):
+        source = self.lane_source()
+        source.input_pointer = min(consumed, len(source.input))
+        source.stream = InputStream(chunk=lane.input)
+        source.stream.position = consumed - source.input_pointer
+        binterpreter = Binterpreter(source, lane.output, cache=self.cache)
+        binterpreter.tape.load(memory)
+        binterpreter.head = pointer
+        binterpreter.ip = index
+        binterpreter.step_count = step_count
+        binterpreter.quota = self.quota
+        binterpreter.check_at = check_at
+        try:
+            binterpreter.run()
+        except (Exception, QuotaExceededError) as ex:
+            lane.error = ex
+        lane.step_count, lane.memory, lane.pointer = binterpreter.step_count, binterpreter.memory, binterpreter.pointer
+
+    # Moves the written output to the lanes
+    def flush(self):
+        if not self.written:
+            return
+        lanes = numpy.concatenate([lanes for lanes, _ in self.written])
+        values = numpy.concatenate([values for _, values in self.written])
+        self.written = []
+        # A stable sort keeps the output of every lane in order
+        order = numpy.argsort(lanes, kind='stable')
+        lanes, values = lanes[order], values[order]
+        bounds = numpy.flatnonzero(lanes[1:] != lanes[:-1]) + 1
+        starts = [0] + bounds.tolist()
+        stops = bounds.tolist() + [len(lanes)]
+        for lane, start, stop in zip(lanes[starts].tolist(), starts, stops):
+            self.lanes[lane].output.put_bytes(values[start:stop].tobytes())
+
+    # Makes the rows long enough for the active lanes to get to the cells need (relative to the rows). Lanes that
+    # would need more than max_width cells are finished on their own from the instruction at index. Returns True
+    # if anything changed, the instruction then starts over with the new state.
+    def widen(self, need, index):
+        furthest = int(need.max())
+        if furthest < self.width:
+            # The bound was too loose
+            self.top = int((self.cell - self.base).max())
+            return False
+        width = min(max(2 * self.width, furthest + 1), self.max_width)
+        if furthest >= width:
+            self.detach(need >= width, index)
+        if width > self.width:
+            self.save()
+            count = len(self.lanes)
+            store = bytearray(count * width)
+            flat = numpy.frombuffer(store, dtype=numpy.uint8)
+            flat.reshape(count, width)[:, :self.width] = self.flat.reshape(count, self.width)
+            self.store, self.flat, self.width = store, flat, width
+            self.load()
+        return True
+
+    def run(self, ip):
+        code = self.code
+        while True:
+            if ip == self.merge_at:
+                self.unpark()
+            if self.count <= self.FEW:
+                if self.count:
+                    self.detach(numpy.ones(self.count, dtype=bool), ip)
+                if not self.parked:
+                    return
+                ip = self.unpark()
+                continue
+
+            op, arg, position, steps = code[ip]
+            flat = self.flat
+
+            if op == ADD:
+                flat[self.cell] += arg
+                self.pending += steps
+                ip += 1
+            elif op == MOVE:
+                if arg > 0:
+                    if self.top + arg >= self.width and self.widen(self.cell - self.base + arg, ip):
+                        continue
+                    self.cell += arg
+                    self.top += arg
+                    numpy.maximum(self.last, self.cell, out=self.last)
+                else:
+                    self.cell += arg
+                    # The pointer stops at the first cell
+                    numpy.maximum(self.cell, self.base, out=self.cell)
+                self.pending += steps
+                ip += 1
+            elif op == BLOCK:
+                after, block_steps, (targets, shift, min_offset, max_offset) = arg
+                applied = None
+                if min_offset < 0:
+                    applied = self.cell - self.base >= -min_offset
+                    number = numpy.count_nonzero(applied)
+                    if number == 0:
+                        ip += 1
+                        continue
+                    if number == self.count:
+                        applied = None
+                if self.top + max_offset >= self.width and self.widen(self.cell - self.base + max_offset, ip):
+                    continue
+                cell = self.cell if applied is None else self.cell[applied]
+                for offset, change in targets:
+                    flat[cell + offset] += change
+                if applied is None:
+                    if max_offset > 0:
+                        numpy.maximum(self.last, cell + max_offset, out=self.last)
+                    self.cell += shift
+                    self.top += max(shift, 0)
+                    self.pending += block_steps
+                    ip = after
+                else:
+                    self.last[applied] = numpy.maximum(self.last[applied], cell + max_offset)
+                    self.cell[applied] = cell + shift
+                    self.steps[applied] += block_steps
+                    self.park(applied, after)
+                    ip += 1
+            elif op == OPEN:
+                self.pending += steps
+                number = numpy.count_nonzero(flat[self.cell])
+                if number == 0:
+                    ip = arg + 1
+                else:
+                    if number < self.count:
+                        self.park(flat[self.cell] == 0, arg + 1)
+                    ip += 1
+            elif op == CLOSE:
+                self.pending += steps
+                number = numpy.count_nonzero(flat[self.cell])
+                if number == 0:
+                    ip += 1
+                else:
+                    if number < self.count:
+                        self.park(flat[self.cell] == 0, ip + 1)
+                    ip = arg + 1
+                    if self.quota is not None:
+                        self.checkpoint()
+            elif op == MULTIPLY:
+                after, loop_steps, (targets, counter, min_offset, max_offset) = arg
+                values = flat[self.cell].astype(numpy.int64)
+                applied = values != 0
+                if min_offset < 0:
+                    applied &= self.cell - self.base >= -min_offset
+                if self.top + max_offset >= self.width and applied.any() and \
+                        self.widen(numpy.where(applied, self.cell - self.base + max_offset, 0), ip):
+                    continue
+                counts = values if counter == 255 else 256 - values
+                cell = self.cell[applied]
+                applied_counts = counts[applied]
+                for offset, change in targets:
+                    flat[cell + offset] += ((applied_counts * change) & 0xFF).astype(numpy.uint8)
+                flat[cell] = 0
+                self.last[applied] = numpy.maximum(self.last[applied], cell + max_offset)
+                self.steps += numpy.where(applied, 1 + counts * loop_steps, values == 0)
+                # Lanes with a zero cell skip the loop as well
+                skipped = applied | (values == 0)
+                number = numpy.count_nonzero(skipped)
+                if number == self.count:
+                    ip = after
+                else:
+                    if number:
+                        self.park(skipped, after)
+                    ip += 1
+            elif op == CLEAR:
+                after, loop_steps, counter = arg
+                values = flat[self.cell].astype(numpy.int64)
+                counts = values if counter == 255 else (256 - values) & 0xFF
+                self.steps += 1 + loop_steps * counts
+                flat[self.cell] = 0
+                ip = after
+            elif op == SCAN:
+                after, loop_steps, direction = arg
+                found = self.scan(direction)
+                if direction > 0:
+                    if int(found.max()) >= self.width and self.widen(found, ip):
+                        continue
+                    found += self.base
+                    self.steps += 1 + (found - self.cell) * loop_steps
+                    self.cell = found
+                    numpy.maximum(self.last, found, out=self.last)
+                    self.top = int((found - self.base).max())
+                    ip = after
+                else:
+                    applied = found >= 0
+                    found += self.base
+                    self.steps += numpy.where(applied, 1 + (self.cell - found) * loop_steps, 0)
+                    self.cell = numpy.where(applied, found, self.cell)
+                    number = numpy.count_nonzero(applied)
+                    if number == self.count:
+                        ip = after
+                    else:
+                        if number:
+                            self.park(applied, after)
+                        ip += 1
+            elif op == OUT:
+                self.written.append((self.active, flat[self.cell]))
+                self.pending += steps
+                ip += 1
+            elif op == IN:
+                available = self.read < self.input_lengths
+                values = self.inputs[self.input_offsets + numpy.minimum(self.read, self.input_lengths)]
+                flat[self.cell] = numpy.where(available, values, flat[self.cell] if self.eof is None else self.eof)
+                self.read += available
+                self.pending += steps
+                ip += 1
+            elif op == DEBUG:
+                self.detach(numpy.ones(self.count, dtype=bool), ip)
+            else:
+                self.pending += steps
+                self.retire(numpy.ones(self.count, dtype=bool))
+
+    # Returns the positions (relative to the rows) of the nearest zero cells of the active lanes in direction, -1 for
+    # lanes without any to the left and width for lanes without any to the right within their rows
+    def scan(self, direction):
+        found = self.cell - self.base
+        moving = numpy.flatnonzero(self.flat[self.cell])
+        store, width = self.store, self.width
+        for lane, base, pointer in zip(moving.tolist(), self.base[moving].tolist(), found[moving].tolist()):
+            if direction > 0:
+                position = store.find(b'\x00', base + pointer, base + width)
+                found[lane] = position - base if position >= 0 else width
+            else:
+                position = store.rfind(b'\x00', base, base + pointer + 1)
+                found[lane] = position - base if position >= 0 else -1
+        return found
+
+    # Checks the quota of the lanes that got to their checkpoint, which happens when a loop jumps back
+    def checkpoint(self):
+        steps = self.steps + self.pending
+        due = numpy.flatnonzero(steps >= self.check)
+        if not len(due):
+            return
+        if self.quota.output is not None:
+            self.flush()
+        exceeded = numpy.zeros(self.count, dtype=bool)
+        for index in due.tolist():
+            lane = self.lanes[int(self.active[index])]
+            try:
+                self.check[index] = self.quota.check(int(steps[index]), lane.output)
+            except QuotaExceededError as ex:
+                lane.error = ex
+                exceeded[index] = True
+        if exceeded.any():
+            self.retire(exceeded)
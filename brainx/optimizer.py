@@ -0,0 +1,124 @@
+__author__ = 'Daniel Maly'
+
+from compiler import Instruction, ADD, MOVE, OPEN, CLOSE, CLEAR, SCAN, MULTIPLY, BLOCK
+
+
+# Rewrites common loop shapes of compiled programs into single operations:
+#   [-], [+]                    CLEAR     the cell is set to zero
+#   [>], [<]                    SCAN      the pointer jumps to the nearest zero cell
+#   [>+<-], [>+>++<<-] etc.     MULTIPLY  the cell is added (times a factor) to its targets and set to zero
+#
+# The recognized instruction is placed right before the original loop, which stays in the code. When the idiom can't
+# be applied (a scan or a transfer that would hit the left end of the memory) the interpreter falls through to the
+# loop and executes it the usual way.
+#
+# Idiom instructions have arg = (exit, loop_steps, data), where exit is the index right after the loop,
+# loop_steps is the number of steps taken by one iteration (body plus closing bracket) and data is
+#   CLEAR     the counter, i.e. how much the cell changes in one iteration (1 or 255)
+#   SCAN      the direction of the scan (1 or -1)
+#   MULTIPLY  a tuple (targets, counter, min_offset, max_offset), targets being pairs (offset, change per iteration)
+#
+# Straight runs of at least two ADD and MOVE instructions (outside the loops replaced by idioms) get a BLOCK the same
+# way: the cells are changed at their offsets from the current one and the pointer moves once at the end, instead of
+# moving cell by cell. Every cell is changed (and wrapped around) once however many times the run changes it. A BLOCK
+# has arg = (exit, steps, data), where exit is the index right after the run, steps the number of steps of the run and
+# data a tuple (targets, shift, min_offset, max_offset), targets being pairs (offset, change) and shift the distance
+# the pointer moves. The run itself stays in the code for a block that would hit the left end of the memory.
+class Optimizer:
+    def __init__(self, code):
+        self.code = code
+
+    def optimize(self):
+        code = self.code
+        optimized = []
+        new_index = {}
+        # Index of the first instruction placed for an original one, an idiom is placed before its loop
+        first_index = {}
+        idioms = []
+        blocks = []
+        # Body of the last loop replaced by an idiom ends here
+        idiom_close = -1
+        # End of the last straight run
+        run_stop = 0
+
+        for index, instruction in enumerate(code):
+            first_index[index] = len(optimized)
+            op = instruction.op
+            if op == OPEN:
+                idiom = self.recognize(code, index + 1, instruction.arg)
+                if idiom is not None:
+                    idioms.append((len(optimized), instruction.arg))
+                    idiom_close = instruction.arg
+                    op, data = idiom
+                    optimized.append(Instruction(op, data, instruction.end - 1, 0))
+            elif (op == ADD or op == MOVE) and index >= run_stop and index > idiom_close:
+                run_stop = index + 1
+                while code[run_stop].op == ADD or code[run_stop].op == MOVE:
+                    run_stop += 1
+                if run_stop - index >= 2:
+                    blocks.append((len(optimized), index, run_stop))
+                    start = code[index - 1].end if index > 0 else 0
+                    optimized.append(Instruction(BLOCK, self.summarize(code[index:run_stop])[1:], start, 0))
+            new_index[index] = len(optimized)
+            optimized.append(instruction)
+
+        for index, instruction in enumerate(optimized):
+            if instruction.op == OPEN or instruction.op == CLOSE:
+                optimized[index] = instruction._replace(arg=new_index[instruction.arg])
+
+        for index, close_index in idioms:
+            idiom = optimized[index]
+            loop_steps = sum(instruction.steps for instruction in code[code[close_index].arg + 1:close_index + 1])
+            optimized[index] = idiom._replace(arg=(new_index[close_index] + 1, loop_steps, idiom.arg))
+
+        for index, start, stop in blocks:
+            block = optimized[index]
+            steps = sum(instruction.steps for instruction in code[start:stop])
+            optimized[index] = block._replace(arg=(first_index[stop], steps, block.arg))
+
+        return optimized
+
+    # Returns (changes, targets, shift, min_offset, max_offset) for a straight run of ADD and MOVE instructions:
+    # changes maps offsets from the first cell to how much they change, targets are its non-zero items in order and
+    # min_offset, max_offset are the furthest cells the pointer gets to
+    @staticmethod
+    def summarize(body):
+        offset = 0
+        min_offset = 0
+        max_offset = 0
+        changes = {}
+        for instruction in body:
+            if instruction.op == ADD:
+                changes[offset] = (changes.get(offset, 0) + instruction.arg) % 256
+            else:
+                offset += instruction.arg
+                min_offset = min(min_offset, offset)
+                max_offset = max(max_offset, offset)
+
+        targets = tuple((target, change) for target, change in sorted(changes.items()) if change != 0)
+        return changes, targets, offset, min_offset, max_offset
+
+    # Returns (opcode, data) for a recognized loop body code[start:stop] or None
+    @staticmethod
+    def recognize(code, start, stop):
+        for index in range(start, stop):
+            if code[index].op != ADD and code[index].op != MOVE:
+                return None
+        body = code[start:stop]
+
+        if len(body) == 1:
+            instruction = body[0]
+            if instruction.op == ADD and (instruction.arg == 1 or instruction.arg == 255):
+                return CLEAR, instruction.arg
+            if instruction.op == MOVE and (instruction.arg == 1 or instruction.arg == -1):
+                return SCAN, instruction.arg
+
+        changes, _, offset, min_offset, max_offset = Optimizer.summarize(body)
+
+        # The loop has to end where it started and count its own cell down (or up) by one
+        if offset != 0 or changes.get(0) not in (1, 255):
+            return None
+
+        counter = changes.pop(0)
+        targets = tuple((target, change) for target, change in sorted(changes.items()) if change != 0)
+        return MULTIPLY, (targets, counter, min_offset, max_offset)
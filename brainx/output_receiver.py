@@ -2,26 +2,88 @@ __author__ = 'Daniel Maly'
 
 import sys
 import glob
+from quota import QuotaExceededError
 
 
+# Output of the program is collected in the bytearray output and written as raw bytes to sys.stdout.buffer.
+# Bytes waiting to be written are kept in buffer, which is flushed according to flush_policy:
+#   byte    after every byte, like a plain unbuffered terminal
+#   line    after a newline, once BUFFER_SIZE bytes are waiting and before reading input
+#   input   once BUFFER_SIZE bytes are waiting and before reading input
+#   full    only once BUFFER_SIZE bytes are waiting
+# Whatever is left is written by flush() when the program ends. The default is line on a terminal and input otherwise,
+# so interactive programs show their prompts right away and the others get full throughput. No more than limit bytes
+# are ever written, flush() raises QuotaExceededError when it has to leave some out.
 class OutputReceiver:
-    def __init__(self):
-        self.output = []
+    BUFFER_SIZE = 64 * 1024
+    FLUSH_POLICIES = ('byte', 'line', 'input', 'full')
+
+    def __init__(self, flush_policy=None, buffer_size=BUFFER_SIZE):
+        self.output = bytearray()
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.limit = None
+        self.written = 0
         self.debug_info = None
         self.print_to_stdout = True
         self.print_debug_to_stdout = False
 
+        if flush_policy is None:
+            flush_policy = 'line' if sys.stdout.isatty() else 'input'
+        self.flush_policy = flush_policy
+        self.flush_on_newline = flush_policy in ('byte', 'line')
+        self.flush_on_input = flush_policy != 'full'
+        if flush_policy == 'byte':
+            self.buffer_size = 1
+
     def put_char(self, char):
         self.output.append(char)
         if self.print_to_stdout:
-            sys.stdout.write(chr(char))
+            buffer = self.buffer
+            buffer.append(char)
+            if len(buffer) >= self.buffer_size or (char == 10 and self.flush_on_newline):
+                self.flush()
+
+    def put_bytes(self, data):
+        self.output += data
+        if self.print_to_stdout:
+            buffer = self.buffer
+            buffer += data
+            if len(buffer) >= self.buffer_size or (self.flush_on_newline and 10 in data):
+                self.flush()
+
+    # Called right before the program reads input
+    def before_input(self):
+        if self.flush_on_input and self.buffer:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        cut = self.limit is not None and self.written + len(self.buffer) > self.limit
+        if cut:
+            del self.buffer[max(self.limit - self.written, 0):]
+        self.written += len(self.buffer)
+
+        # Text written through sys.stdout (printed steps, debug output) has to come first
+        sys.stdout.flush()
+        stream = getattr(sys.stdout, 'buffer', None)
+        if stream is not None:
+            stream.write(self.buffer)
+            stream.flush()
+        else:
+            sys.stdout.write(self.buffer.decode('latin-1'))
             sys.stdout.flush()
+        self.buffer.clear()
+
+        if cut:
+            raise QuotaExceededError("The program wrote more than {} bytes".format(self.limit), 'output', self.limit)
 
     def output_bytes(self):
         return bytes(self.output)
 
     def get_debug_data(self, input_debug_data, binterpreter):
-        memory = "# memory\n" + str(bytes(binterpreter.memory)) + "\n\n"
+        memory = "# memory\n" + binterpreter.tape.debug_memory() + "\n\n"
         memory_pointer = "# memory pointer\n" + str(binterpreter.pointer) + "\n\n"
         output = "# output\n" + str(self.output_bytes()) + "\n\n"
 
@@ -40,6 +102,7 @@ class OutputReceiver:
         debug_data = self.get_debug_data(input_debug_data, binterpreter)
 
         if self.print_debug_to_stdout:
+            self.flush()
             print(debug_data)
 
         with open(filename, 'w') as file:
@@ -0,0 +1,47 @@
+__author__ = 'Daniel Maly'
+
+from snapshot import Snapshot, SnapshotError
+
+
+# Everything a program does before its first input-dependent instruction (the first ',', but also a '#' or the end,
+# which show the state) is the same on every run, and some programs spend millions of steps there building tables and
+# strings. The state at that point is kept in a cache of prepared programs as a snapshot.Snapshot, so the next run
+# starts right there: it writes out the output of the prefix at once and carries on with the rest of the program.
+#
+# Brainfuck can't start a program in the middle of a loop, so the specialized program is not a new source but the
+# original code started at the saved position (see Binterpreter.resume_position). The state is saved by the first
+# plain run of the program (see Binterpreter.run), which costs it nothing, and only for programs started with empty
+# memory. Memory that grows to the left makes another prefix than memory that stops at its first cell, so the two
+# are kept apart.
+class Prefix:
+    KIND = 'prefix'
+    # Bigger states (memory and output together) are not kept
+    MAX_SIZE = 1 << 20
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def kind(self, tape):
+        return self.KIND + ('-bidirectional' if tape.bidirectional else '')
+
+    def store(self, binterpreter):
+        snapshot = Snapshot.of(binterpreter)
+        if len(snapshot.memory) + len(snapshot.output) <= self.MAX_SIZE:
+            self.cache.store(binterpreter.program, self.kind(binterpreter.tape), snapshot.pack())
+
+    # Moves binterpreter to the end of the prefix, returns False if the prefix is not known yet
+    def restore(self, binterpreter):
+        data = self.cache.load(binterpreter.program, self.kind(binterpreter.tape))
+        if data is None:
+            return False
+        try:
+            snapshot = Snapshot.unpack(data)
+        except SnapshotError:
+            return False
+
+        # The prefix itself would have gone over the limit
+        binterpreter.tape.check_limit(0, len(snapshot.memory))
+        output, snapshot.output = snapshot.output, b''
+        snapshot.restore(binterpreter)
+        binterpreter.output.put_bytes(output)
+        return True
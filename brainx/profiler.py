@@ -0,0 +1,118 @@
+__author__ = 'Daniel Maly'
+
+import json
+from compiler import OPEN, CLEAR, SCAN, MULTIPLY, BLOCK
+
+
+# Execution counts of a compiled program, filled by Binterpreter.profile:
+#   counts[i]   how many times the instruction code[i] was executed
+#   steps[i]    how many steps it accounted for
+#   skipped[i]  how many times a loop idiom code[i] replaced its whole loop
+#
+# Loops are reported by the position of their [ in the source. A loop is entered once for every execution of its [
+# and every time its idiom replaced it, and iterates once for every execution of its ] plus the iterations its idiom
+# did at once. The steps of a loop include the steps of the loops inside it.
+class Profiler:
+    SNIPPET_LENGTH = 40
+
+    def __init__(self, code, program):
+        self.code = code
+        self.program = program
+        self.counts = [0] * len(code)
+        self.steps = [0] * len(code)
+        self.skipped = [0] * len(code)
+
+    def total_steps(self):
+        return sum(self.steps)
+
+    def snippet(self, start, stop):
+        text = self.program[start:stop]
+        if len(text) > self.SNIPPET_LENGTH:
+            text = text[:self.SNIPPET_LENGTH - 3] + "..."
+        return text
+
+    # Position in the source where code[index] starts
+    def source_start(self, index):
+        code = self.code
+        if code[index].op in (CLEAR, SCAN, MULTIPLY, BLOCK):
+            return code[index].end
+        while index > 0 and code[index - 1].op in (CLEAR, SCAN, MULTIPLY, BLOCK):
+            index -= 1
+        return code[index - 1].end if index > 0 else 0
+
+    def instructions(self):
+        instructions = []
+        for index, instruction in enumerate(self.code):
+            if self.counts[index] == 0:
+                continue
+            start = self.source_start(index)
+            if instruction.op in (CLEAR, SCAN, MULTIPLY, BLOCK):
+                stop = self.code[instruction.arg[0] - 1].end
+            else:
+                stop = instruction.end
+            instructions.append({
+                'index': index,
+                'position': start,
+                'source': self.snippet(start, stop),
+                'count': self.counts[index],
+                'steps': self.steps[index]
+            })
+        return instructions
+
+    def loops(self):
+        code = self.code
+        loops = []
+        for index, instruction in enumerate(code):
+            if instruction.op != OPEN:
+                continue
+            close = instruction.arg
+            first = index
+            idiom_iterations = 0
+            entries = self.counts[index]
+            if index > 0 and code[index - 1].op in (CLEAR, SCAN, MULTIPLY) and code[index - 1].arg[0] == close + 1:
+                first = index - 1
+                idiom = code[first]
+                loop_steps = idiom.arg[1]
+                entries += self.skipped[first]
+                # Every replaced loop took one step for the [ and loop_steps for each of its iterations
+                idiom_iterations = (self.steps[first] - self.skipped[first]) // loop_steps
+            if entries == 0:
+                continue
+
+            position = instruction.end - 1
+            iterations = self.counts[close] + idiom_iterations
+            loops.append({
+                'position': position,
+                'source': self.snippet(position, code[close].end),
+                'entries': entries,
+                'iterations': iterations,
+                'average_iterations': iterations / entries,
+                'steps': sum(self.steps[first:close + 1])
+            })
+        loops.sort(key=lambda loop: loop['steps'], reverse=True)
+        return loops
+
+    def as_dict(self):
+        return {
+            'steps': self.total_steps(),
+            'loops': self.loops(),
+            'instructions': self.instructions()
+        }
+
+    def write_json(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.as_dict(), file, indent=1)
+
+    def print_report(self, file, top=10):
+        total = max(self.total_steps(), 1)
+        loops = self.loops()
+        print("# profile", file=file)
+        print("{} steps, {} instructions executed".format(self.total_steps(), sum(self.counts)), file=file)
+        print("", file=file)
+        print("# hottest loops", file=file)
+        print("{:>4} {:>9} {:>14} {:>7} {:>10} {:>12} {:>10}  {}".format(
+            'rank', 'position', 'steps', '%', 'entries', 'iterations', 'average', 'source'), file=file)
+        for rank, loop in enumerate(loops[:top], 1):
+            print("{:>4} {:>9} {:>14} {:>6.1f}% {:>10} {:>12} {:>10.1f}  {}".format(
+                rank, loop['position'], loop['steps'], 100 * loop['steps'] / total, loop['entries'],
+                loop['iterations'], loop['average_iterations'], loop['source']), file=file)
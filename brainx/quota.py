@@ -0,0 +1,63 @@
+__author__ = 'Daniel Maly'
+
+import signal
+import time
+
+
+class QuotaExceededError(BaseException):
+    def __init__(self, message, resource=None, limit=None):
+        super().__init__(message)
+        self.resource = resource
+        self.limit = limit
+
+
+# Limits on the steps, the running time (in seconds) and the output (in bytes) of a program, None meaning no limit.
+# The number of memory cells is limited by the tape itself, see tape.Tape.
+#
+# The interpreters don't check the limits after every instruction, only when a loop jumps back and the step count gets
+# to the value returned by the last check (see Binterpreter.checkpoint). Any program that runs long has to jump back,
+# and the check costs one comparison until then. The limits may be overstepped by the code run between two checks,
+# which is at most BATCH steps plus one pass through the code without loops. Only the written output is cut exactly.
+class Quota:
+    BATCH = 1 << 16
+    # Step count at which no check is ever made
+    NEVER = 1 << 62
+
+    def __init__(self, steps=None, seconds=None, output=None):
+        self.steps = steps
+        self.seconds = seconds
+        self.output = output
+        self.deadline = None
+
+    def start(self):
+        if self.seconds is not None:
+            self.deadline = time.monotonic() + self.seconds
+
+    # Raises QuotaExceededError if a limit has been exceeded, otherwise returns the step count of the next check
+    def check(self, step_count, output_receiver):
+        if self.steps is not None and step_count > self.steps:
+            raise QuotaExceededError("The program took more than {} steps".format(self.steps), 'steps', self.steps)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise QuotaExceededError("The program ran for more than {} seconds".format(self.seconds), 'time',
+                                     self.seconds)
+        if self.output is not None and len(output_receiver.output) > self.output:
+            raise QuotaExceededError("The program wrote more than {} bytes".format(self.output), 'output',
+                                     self.output)
+
+        check_at = step_count + self.BATCH
+        if self.steps is not None:
+            check_at = min(check_at, self.steps + 1)
+        return check_at
+
+    # Generated code has no place to check the time, a timer interrupts it instead
+    def start_timer(self):
+        if self.seconds is not None and hasattr(signal, 'setitimer'):
+            signal.signal(signal.SIGALRM, self.timeout)
+            signal.setitimer(signal.ITIMER_REAL, self.seconds)
+
+    def stop_timer(self):
+        if self.seconds is not None and hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    def timeout(self, signum, frame):
+        raise QuotaExceededError("The program ran for more than {} seconds".format(self.seconds), 'time', self.seconds)
@@ -0,0 +1,77 @@
+__author__ = 'Daniel Maly'
+
+import struct
+
+
+class TraceFormatError(BaseException):
+    def __init__(self, filename):
+        super().__init__("{} is not a brainx trace".format(filename))
+        self.filename = filename
+
+
+# Records every step of a program as a fixed-width binary record, the same information -s prints as text:
+#   step      number of steps taken so far
+#   position  position in the source program right after the instruction
+#   pointer   memory pointer before the instruction
+#   value     value of the current cell before the instruction
+#   symbol    the instruction itself (a character of the program, N for the end)
+#
+# The records are packed into the preallocated bytearray buffer by the interpreter itself (see Binterpreter.trace).
+# Once the buffer is full, it is written to the file, or, when only the last records are kept, overwritten from the
+# beginning like a ring. The file starts with MAGIC, decode() turns it back into the text -s prints.
+class TraceRecorder:
+    MAGIC = b'BXTR\x01'
+    RECORD = struct.Struct('<QQqBc')
+    CAPACITY = 64 * 1024
+
+    def __init__(self, file, capacity=CAPACITY, ring=False):
+        self.file = file
+        self.ring = ring
+        self.wrapped = False
+        self.buffer = bytearray(capacity * self.RECORD.size)
+        self.file.write(self.MAGIC)
+
+    @classmethod
+    def for_file(cls, filename, last=None):
+        if last is not None:
+            return cls(open(filename, 'wb'), last, ring=True)
+        return cls(open(filename, 'wb'))
+
+    # Called by the interpreter once the buffer is full
+    def full(self):
+        if self.ring:
+            self.wrapped = True
+        else:
+            self.file.write(self.buffer)
+
+    # Called by the interpreter at the end with the size of the part of the buffer filled since the last full()
+    def close(self, size):
+        if self.wrapped:
+            # The oldest records are the ones right after the newest
+            self.file.write(self.buffer[size:])
+        self.file.write(self.buffer[:size])
+        self.file.close()
+
+    @classmethod
+    def records(cls, filename, chunk_records=CAPACITY):
+        with open(filename, 'rb') as file:
+            if file.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise TraceFormatError(filename)
+            while True:
+                chunk = file.read(chunk_records * cls.RECORD.size)
+                if not chunk:
+                    break
+                # A trace cut short (the interpreter was killed) may end with a partial record
+                chunk = chunk[:len(chunk) - len(chunk) % cls.RECORD.size]
+                yield from cls.RECORD.iter_unpack(chunk)
+
+    @classmethod
+    def decode(cls, filename, file):
+        lines = []
+        for step, position, pointer, value, symbol in cls.records(filename):
+            lines.append("S {} ## I {} ## MP {} ## MV {} ## X {}\n".format(step, position, pointer, value,
+                                                                             symbol.decode('latin-1')))
+            if len(lines) >= 4096:
+                file.write("".join(lines))
+                lines = []
+        file.write("".join(lines))
@@ -0,0 +1,154 @@
+__author__ = 'Daniel Maly'
+
+import hashlib
+import os
+import signal
+import struct
+import zlib
+
+
+class SnapshotError(BaseException):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+# State of a Binterpreter between two instructions, enough to carry on with the program later:
+#   digest          sha256 of the program, a snapshot only fits its own program
+#   position        position in the program of the next instruction
+#   step_count      steps taken so far
+#   pointer         the current cell, relative to the first used cell
+#   origin          the first cell of the original memory, relative to the first used cell
+#   input_pointer   how much of the input given in the program has been read
+#   consumed        how many bytes have been read from the input stream
+#   memory, output  the used part of the memory and the output so far
+#
+# Instructions are not numbered in the snapshot, the program may be compiled differently when it is resumed (folded or
+# not). Snapshots are therefore only taken where an instruction starts in every compiled form of the program: at the
+# start of a loop body (which is where a loop jumps back to) and right after a #.
+class Snapshot:
+    MAGIC = b'BXSN\x01'
+    HEADER = struct.Struct('<32sQQqqQQII')
+
+    def __init__(self, digest, position, step_count, pointer, origin, input_pointer, consumed, memory, output):
+        self.digest = digest
+        self.position = position
+        self.step_count = step_count
+        self.pointer = pointer
+        self.origin = origin
+        self.input_pointer = input_pointer
+        self.consumed = consumed
+        self.memory = memory
+        self.output = output
+
+    @staticmethod
+    def digest_of(program):
+        return hashlib.sha256(program.encode('utf-8')).digest()
+
+    @classmethod
+    def of(cls, binterpreter):
+        tape = binterpreter.tape
+        inp = binterpreter.inp
+        consumed = inp.stream.consumed() if inp.stream is not None else 0
+        return cls(cls.digest_of(binterpreter.program), binterpreter.program_pointer, binterpreter.step_count,
+                   binterpreter.head - tape.start, tape.origin - tape.start, inp.input_pointer, consumed,
+                   tape.dump(), binterpreter.output.output_bytes())
+
+    def restore(self, binterpreter):
+        if self.digest != self.digest_of(binterpreter.program):
+            raise SnapshotError("The snapshot was taken of another program")
+
+        tape = binterpreter.tape
+        tape.restore(self.memory, self.origin)
+        binterpreter.head = tape.start + self.pointer
+        binterpreter.step_count = self.step_count
+        binterpreter.resume_position = self.position
+
+        inp = binterpreter.inp
+        inp.input_pointer = self.input_pointer
+        # Only an input given as a file can be read again, what was read from stdin is gone
+        if inp.stream is not None:
+            inp.stream.skip(self.consumed)
+
+        output = binterpreter.output
+        output.output = bytearray(self.output)
+        output.written = len(self.output)
+
+    def pack(self):
+        memory = zlib.compress(self.memory, 1)
+        output = zlib.compress(self.output, 1)
+        header = self.HEADER.pack(self.digest, self.position, self.step_count, self.pointer, self.origin,
+                                  self.input_pointer, self.consumed, len(memory), len(output))
+        return self.MAGIC + header + memory + output
+
+    @classmethod
+    def unpack(cls, data, name="The snapshot"):
+        if not data.startswith(cls.MAGIC) or len(data) < len(cls.MAGIC) + cls.HEADER.size:
+            raise SnapshotError("{} is not a brainx snapshot".format(name))
+
+        fields = cls.HEADER.unpack_from(data, len(cls.MAGIC))
+        memory_size, output_size = fields[-2:]
+        start = len(cls.MAGIC) + cls.HEADER.size
+        try:
+            memory = zlib.decompress(data[start:start + memory_size])
+            output = zlib.decompress(data[start + memory_size:start + memory_size + output_size])
+        except zlib.error:
+            raise SnapshotError("{} is damaged".format(name))
+        return cls(*fields[:-2], memory, output)
+
+    # Written to a temporary file first, so the previous snapshot stays whole until the new one is complete
+    def write(self, filename):
+        temporary = "{}.{}.tmp".format(filename, os.getpid())
+        with open(temporary, 'wb') as file:
+            file.write(self.pack())
+        os.replace(temporary, filename)
+
+    @classmethod
+    def read(cls, filename):
+        try:
+            with open(filename, 'rb') as file:
+                data = file.read()
+        except OSError as ex:
+            raise SnapshotError("Cannot read the snapshot {}: {}".format(filename, ex.strerror))
+        return cls.unpack(data, filename)
+
+
+# Takes snapshots of a running Binterpreter into filename: every `every` steps (unless it is None), at every # and on
+# SIGUSR1. The interpreter asks for them at its checkpoints (see Binterpreter.checkpoint), so a signal is answered
+# at the next one.
+class Snapshotter:
+    # Steps between checkpoints when a signal may come
+    BATCH = 1 << 16
+
+    def __init__(self, filename, every=None):
+        self.filename = filename
+        self.every = every
+        self.requested = False
+        self.last_step = None
+
+    def install(self):
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self.request)
+
+    def request(self, signum, frame):
+        self.requested = True
+
+    def take(self, binterpreter):
+        Snapshot.of(binterpreter).write(self.filename)
+        self.requested = False
+        self.last_step = binterpreter.step_count
+
+    # Takes a snapshot if one is due, returns the step count of the next checkpoint
+    def check(self, binterpreter):
+        step_count = binterpreter.step_count
+        if self.last_step is None:
+            self.last_step = step_count
+        if self.requested or self.every is not None and step_count - self.last_step >= self.every:
+            if not binterpreter.at_loop_start():
+                # Step by step execution may come here anywhere, it is asked again after the next step
+                return step_count + 1
+            self.take(binterpreter)
+
+        check_at = step_count + self.BATCH
+        if self.every is not None:
+            check_at = min(check_at, self.last_step + self.every)
+        return check_at
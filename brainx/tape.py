@@ -0,0 +1,239 @@
+__author__ = 'Daniel Maly'
+
+import mmap
+import tempfile
+from quota import QuotaExceededError
+
+
+class TapeLimitError(QuotaExceededError):
+    def __init__(self, limit):
+        super().__init__("The program needs more than {} memory cells".format(limit), 'tape', limit)
+
+
+# Memory of the interpreter.
+#
+# The cells live in the bytearray data, which may be larger than the part used by the program. Cells between start
+# and end (physical indices into data) have been reached by the program, the rest is spare room filled with zeros.
+# origin is the physical index of the first cell of the original tape.
+#
+# The interpreters work with physical indices directly and only call grow() when they get to end or beyond, or
+# grow_left() when they get before start. Both grow the spare room geometrically, so moving keeps amortized constant
+# time in both directions. Unless the tape is bidirectional, it stops at its first cell like the original interpreter.
+class Tape:
+    MIN_GROWTH = 1024
+
+    def __init__(self, memory=b'\x00', capacity=0, limit=None, bidirectional=False):
+        self.capacity = capacity
+        self.limit = limit
+        self.bidirectional = bidirectional
+        self.load(memory)
+
+    def load(self, memory):
+        self.data = bytearray(memory)
+        if len(self.data) < self.capacity:
+            self.data.extend(bytes(self.capacity - len(self.data)))
+        self.origin = 0
+        self.start = 0
+        self.end = len(memory)
+
+    # Loads the used part of the memory with the original first cell at origin_offset (see snapshot.Snapshot)
+    def restore(self, memory, origin_offset):
+        self.load(memory)
+        self.origin = self.start + origin_offset
+
+    def check_limit(self, start, end):
+        if self.limit is not None and end - start > self.limit:
+            raise TapeLimitError(self.limit)
+
+    # Makes position (which is at least end) a used cell, returns the new end
+    def grow(self, position):
+        self.check_limit(self.start, position + 1)
+        data = self.data
+        if position >= len(data):
+            data.extend(bytes(max(position + 1 - len(data), len(data), self.MIN_GROWTH)))
+        self.end = position + 1
+        return self.end
+
+    # Called with a position before start, returns the position the pointer really ends up at
+    def grow_left(self, position):
+        if not self.bidirectional:
+            return self.start
+
+        self.check_limit(position, self.end)
+        if position < 0:
+            shift = max(-position, self.end, self.MIN_GROWTH)
+            self.data[0:0] = bytes(shift)
+            self.origin += shift
+            self.end += shift
+            position += shift
+        self.start = position
+        return position
+
+    # Used part of the memory
+    def dump(self):
+        return bytes(self.data[self.start:self.end])
+
+    # Index of a physical position as shown in debug output
+    def index(self, position):
+        return position - self.start
+
+    # Memory as shown in debug output
+    def debug_memory(self):
+        return str(self.dump())
+
+    def __len__(self):
+        return self.end - self.start
+
+
+# Memory of a PagedTape: pages of PAGE_SIZE cells allocated on the first write of a non-zero value, so reading
+# cells the program never touched costs nothing
+class PagedMemory:
+    PAGE_BITS = 12
+    PAGE_SIZE = 1 << PAGE_BITS
+    PAGE_MASK = PAGE_SIZE - 1
+
+    def __init__(self, size):
+        self.pages = {}
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        page = self.pages.get(index >> self.PAGE_BITS)
+        if page is None:
+            return 0
+        return page[index & self.PAGE_MASK]
+
+    def __setitem__(self, index, value):
+        page = self.pages.get(index >> self.PAGE_BITS)
+        if page is None:
+            if value == 0:
+                return
+            page = bytearray(self.PAGE_SIZE)
+            self.pages[index >> self.PAGE_BITS] = page
+        page[index & self.PAGE_MASK] = value
+
+    # Missing pages are all zeros, so searching for a zero (which is all the interpreters do) stops at the first one
+    def find(self, sub, start=0, stop=None):
+        stop = self.size if stop is None else stop
+        index = start
+        while index < stop:
+            number = index >> self.PAGE_BITS
+            base = number << self.PAGE_BITS
+            page_stop = min(base + self.PAGE_SIZE, stop)
+            page = self.pages.get(number)
+            if page is None:
+                if sub == b'\x00':
+                    return index
+            else:
+                found = page.find(sub, index - base, page_stop - base)
+                if found >= 0:
+                    return base + found
+            index = page_stop
+        return -1
+
+    def rfind(self, sub, start=0, stop=None):
+        stop = self.size if stop is None else stop
+        index = stop
+        while index > start:
+            number = (index - 1) >> self.PAGE_BITS
+            base = number << self.PAGE_BITS
+            page_start = max(base, start)
+            page = self.pages.get(number)
+            if page is None:
+                if sub == b'\x00':
+                    return index - 1
+            else:
+                found = page.rfind(sub, page_start - base, index - base)
+                if found >= 0:
+                    return base + found
+            index = page_start
+        return -1
+
+    def read(self, start, stop):
+        return bytes(self[index] for index in range(start, stop))
+
+
+# Tape for programs that roam far across the memory. The memory is a PagedMemory large enough for any practical
+# program, with the origin in its middle, so neither direction ever needs to move the cells.
+class PagedTape(Tape):
+    SIZE = 1 << 62
+
+    def load(self, memory):
+        self.data = PagedMemory(self.SIZE)
+        self.origin = self.SIZE // 2
+        self.start = self.origin
+        self.end = self.origin + len(memory)
+        for index, value in enumerate(memory):
+            self.data[self.origin + index] = value
+
+    def grow(self, position):
+        self.check_limit(self.start, position + 1)
+        self.end = position + 1
+        return self.end
+
+    def grow_left(self, position):
+        if not self.bidirectional:
+            return self.start
+        self.check_limit(position, self.end)
+        self.start = position
+        return position
+
+    def dump(self):
+        return self.data.read(self.start, self.end)
+
+    def index(self, position):
+        return position - self.origin
+
+    # Touched pages only, every one of them prefixed with the index of its first cell relative to the origin
+    def debug_memory(self):
+        lines = []
+        for number in sorted(self.data.pages):
+            base = number << PagedMemory.PAGE_BITS
+            lines.append("{}: {}".format(base - self.origin, bytes(self.data.pages[number])))
+        return "\n".join(lines)
+
+
+# Tape in a memory mapped file (a temporary one unless a filename is given), for tapes that don't fit in memory.
+# The file is sparse, so only the parts actually used take up space. The origin of a bidirectional tape is in the
+# middle of the file.
+class MmapTape(Tape):
+    DEFAULT_SIZE = 1 << 30
+
+    def __init__(self, memory=b'\x00', capacity=0, limit=None, bidirectional=False, filename=None):
+        self.filename = filename
+        self.file = None
+        super().__init__(memory, capacity, limit, bidirectional)
+
+    def load(self, memory):
+        size = max(self.capacity, self.DEFAULT_SIZE, 2 * len(memory))
+        if self.file is None:
+            self.file = open(self.filename, 'w+b') if self.filename is not None else tempfile.TemporaryFile()
+        else:
+            self.data.close()
+        self.file.truncate(0)
+        self.file.truncate(size)
+        self.data = mmap.mmap(self.file.fileno(), size)
+        self.origin = size // 2 if self.bidirectional else 0
+        self.start = self.origin
+        self.end = self.origin + len(memory)
+        self.data[self.start:self.end] = bytes(memory)
+
+    def grow(self, position):
+        self.check_limit(self.start, position + 1)
+        if position >= len(self.data):
+            # Resizing the map resizes the file as well
+            self.data.resize(max(position + 1, 2 * len(self.data)))
+        self.end = position + 1
+        return self.end
+
+    def grow_left(self, position):
+        if not self.bidirectional:
+            return self.start
+        if position < 0:
+            # The cells can't be moved around in a mapped file
+            raise TapeLimitError(self.end)
+        self.check_limit(position, self.end)
+        self.start = position
+        return position
@@ -0,0 +1,65 @@
+__author__ = 'Daniel Maly'
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from batch import read_jobs, run_job, run_batch
+from codegen import PythonBinterpreter
+
+
+class TestBatch(unittest.TestCase):
+    PROGRAMS = {
+        'hello.b': "++++++++[>++++[>++>+++>+++>+<<<<-]>+>+>->>+[<]<-]>>.>---.+++++++..+++.>>.<-.<"
+                   ".+++.------.--------.>>+.>++.",
+        'echo.b': ",[.,]",
+        'echo.b.in': "abc",
+        'loop.b': "+[]",
+        'broken.b': "+[",
+    }
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for name, content in self.PROGRAMS.items():
+            with open(self.path(name), 'w') as file:
+                file.write(content)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_read_jobs(self):
+        jobs = read_jobs(self.directory.name)
+        self.assertEqual([(self.path('broken.b'), None), (self.path('echo.b'), self.path('echo.b.in')),
+                          (self.path('hello.b'), None), (self.path('loop.b'), None)], jobs)
+
+        manifest = self.path('manifest')
+        with open(manifest, 'w') as file:
+            file.write("# programs\nhello.b\n\necho.b   hello.b\n")
+        self.assertEqual([(self.path('hello.b'), None), (self.path('echo.b'), self.path('hello.b'))],
+                         read_jobs(manifest))
+
+    def test_run_job(self):
+        options = {'no_cache': True, 'max_steps': 10000}
+        result = run_job((self.path('echo.b'), self.path('echo.b.in')), options)
+        self.assertEqual((0, "abc", 12), (result['status'], result['output'], result['steps']))
+        self.assertEqual(64, run_job((self.path('loop.b'), None), options)['status'])
+        self.assertEqual(16, run_job((self.path('broken.b'), None), options)['status'])
+
+        result = run_job((self.path('hello.b'), None), {'no_cache': True, 'engine': PythonBinterpreter})
+        self.assertEqual((0, "Hello World!\n"), (result['status'], result['output']))
+
+    def test_run_batch(self):
+        jobs = read_jobs(self.directory.name) * 3
+        results = io.StringIO()
+        run_batch(jobs, {'no_cache': True, 'max_time': 0.1}, results, processes=2)
+        lines = [json.loads(line) for line in results.getvalue().splitlines()]
+        self.assertEqual([program for program, _ in jobs], [line['program'] for line in lines])
+        self.assertEqual([16, 0, 0, 64] * 3, [line['status'] for line in lines])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,7 @@ __author__ = 'Daniel Maly'
 import unittest
 from test.dummy_input_source import DummyInputSource
 from test.dummy_output_receiver import DummyOutputReceiver
-from binterpreter import Binterpreter
+from binterpreter import Binterpreter, BracketMismatchError
 from util import *
 
 
@@ -17,4 +17,20 @@ class TestBinterpreter(unittest.TestCase):
         binterpreter = Binterpreter(input_source, output_receiver)
         binterpreter.start()
         self.assertTrue(binterpreter.terminated)
-        self.assertEqual("Hello World!\n", string_from_array(output_receiver.output))
\ No newline at end of file
+        self.assertEqual("Hello World!\n", string_from_array(output_receiver.output))
+
+    def test_skip_loop(self):
+        input_source = DummyInputSource("[>+[>+]<-]+++.", [])
+        output_receiver = DummyOutputReceiver()
+        binterpreter = Binterpreter(input_source, output_receiver)
+        binterpreter.start()
+        self.assertEqual(b'\x03', output_receiver.output)
+
+    def test_unbalanced_brackets(self):
+        with self.assertRaises(BracketMismatchError) as cm:
+            Binterpreter(DummyInputSource("+[>+[-]", []), DummyOutputReceiver())
+        self.assertEqual(1, cm.exception.position)
+
+        with self.assertRaises(BracketMismatchError) as cm:
+            Binterpreter(DummyInputSource("+[-]]", []), DummyOutputReceiver())
+        self.assertEqual(4, cm.exception.position)
@@ -0,0 +1,53 @@
+__author__ = 'Daniel Maly'
+
+import os
+import tempfile
+import time
+import unittest
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from cache import ProgramCache
+from util import *
+
+
+class TestProgramCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ProgramCache.for_directory(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_store_and_load(self):
+        self.assertIsNone(self.cache.load("+++", 'source'))
+        self.cache.store("+++", 'source', ("+++", "input"))
+        self.assertEqual(("+++", "input"), self.cache.load("+++", 'source'))
+        self.assertIsNone(self.cache.load("+++", 'code'))
+
+        self.cache.clear()
+        self.assertIsNone(self.cache.load("+++", 'source'))
+
+    def test_evict_least_recently_used(self):
+        self.cache.max_size = 3500
+        for i in range(3):
+            self.cache.store(str(i), 'source', bytes(1000))
+            # Make sure the modification times differ
+            path = self.cache.path(str(i), 'source')
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        self.cache.load("0", 'source')
+        self.cache.store("3", 'source', bytes(1000))
+
+        self.assertIsNotNone(self.cache.load("0", 'source'))
+        self.assertIsNone(self.cache.load("1", 'source'))
+        self.assertIsNotNone(self.cache.load("3", 'source'))
+
+    def test_cached_program(self):
+        program = "++++++++[>++++[>++>+++>+++>+<<<<-]>+>+>->>+[<]<-]>>.>---.+++++++..+++.>>.<-.<" \
+                  ".+++.------.--------.>>+.>++."
+        for i in range(2):
+            output_receiver = DummyOutputReceiver()
+            binterpreter = Binterpreter(DummyInputSource(program, []), output_receiver, cache=self.cache)
+            binterpreter.start()
+            self.assertEqual("Hello World!\n", string_from_array(output_receiver.output))
+        self.assertIsNotNone(self.cache.load(program, 'code'))
@@ -0,0 +1,45 @@
+__author__ = 'Daniel Maly'
+
+import unittest
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from codegen import PythonBinterpreter, PythonCodeGenerator
+from util import *
+
+
+class TestCodegen(unittest.TestCase):
+    def run_both(self, program, memory=None, pointer=0):
+        results = []
+        for engine in (Binterpreter, PythonBinterpreter):
+            output_receiver = DummyOutputReceiver()
+            binterpreter = engine(DummyInputSource(program, "xy"), output_receiver)
+            if memory is not None:
+                binterpreter.initialize_memory(memory)
+            binterpreter.initialize_pointer(pointer)
+            binterpreter.start()
+            self.assertTrue(binterpreter.terminated)
+            results.append((binterpreter.pointer, bytes(binterpreter.memory), bytes(output_receiver.output)))
+        self.assertEqual(results[0], results[1])
+        return results[1]
+
+    def test_hello_world(self):
+        program = "++++++++[>++++[>++>+++>+++>+<<<<-]>+>+>->>+[<]<-]>>.>---.+++++++..+++.>>.<-.<" \
+                  ".+++.------.--------.>>+.>++."
+        pointer, memory, output = self.run_both(program)
+        self.assertEqual(b"Hello World!\n", output)
+
+    def test_idioms(self):
+        self.run_both("[>+<-]>>[-]<<<[>>+>++<<<-]>>>>[<]>[>],.,+.", [3, 2, 5, 7, 0, 1, 1], 1)
+        self.run_both("+++[<<+>>-]")
+
+    def test_blocks(self):
+        self.run_both("+>>++<<<<+>+>>>-<<+++<<<<<<-.<>>>+++[<<-<<+>+>>>-]<>")
+        self.run_both(">>+<<<<+>+>>>-", [1, 2, 3], 2)
+
+    def test_deep_and_long_programs(self):
+        program = "+" + "[>+" * 40 + "[-]" + "<-]" * 40 + ">+." * 3000
+        functions = PythonCodeGenerator(Binterpreter(DummyInputSource(program, []),
+                                                     DummyOutputReceiver()).code).generate()
+        self.assertTrue(len(functions) > 2)
+        self.run_both(program)
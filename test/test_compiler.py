@@ -0,0 +1,40 @@
+__author__ = 'Daniel Maly'
+
+import unittest
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from compiler import *
+
+
+class TestCompiler(unittest.TestCase):
+    def test_fold_runs(self):
+        code = Compiler("+++--[>>><]").compile()
+        self.assertEqual([
+            Instruction(ADD, 1, 5, 5),
+            Instruction(OPEN, 4, 6, 1),
+            Instruction(MOVE, 3, 9, 3),
+            Instruction(MOVE, -1, 10, 1),
+            Instruction(CLOSE, 1, 11, 1),
+            Instruction(END, None, 11, 1)
+        ], code)
+
+    def test_no_fold(self):
+        code = Compiler("++<", fold=False).compile()
+        self.assertEqual([ADD, ADD, MOVE, END], [instruction.op for instruction in code])
+
+    def test_same_steps_as_unfolded(self):
+        program = "++++++++[>++++[>++>+++>+++>+<<<<-]>+>+>->>+[<]<-]>>.>---.+++++++..+++.>>.<-.<" \
+                  ".+++.------.--------.>>+.>++.<<<<<<<<<<<+"
+        results = []
+        for print_steps in (False, True):
+            binterpreter = Binterpreter(DummyInputSource(program, []), DummyOutputReceiver())
+            if print_steps:
+                binterpreter.code = Compiler(program, fold=False).compile()
+                while not binterpreter.terminated:
+                    binterpreter.step()
+            else:
+                binterpreter.start()
+            results.append((binterpreter.step_count, binterpreter.program_pointer, binterpreter.pointer,
+                            bytes(binterpreter.memory)))
+        self.assertEqual(results[0], results[1])
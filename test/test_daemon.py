@@ -0,0 +1,62 @@
+__author__ = 'Daniel Maly'
+
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+import unittest
+import client
+from brainx import run_arguments
+from daemon import Daemon
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'brainx.sock')
+        self.daemon = multiprocessing.Process(target=Daemon(self.path, run_arguments, workers=2).serve)
+        self.daemon.start()
+        for _ in range(100):
+            if os.path.exists(self.path):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        os.kill(self.daemon.pid, signal.SIGTERM)
+        self.daemon.join()
+        self.directory.cleanup()
+
+    def run_client(self, argv, inp=b''):
+        names = [os.path.join(self.directory.name, name) for name in ('stdin', 'stdout', 'stderr')]
+        with open(names[0], 'wb') as file:
+            file.write(inp)
+        files = [open(names[0], 'rb'), open(names[1], 'wb'), open(names[2], 'wb')]
+        try:
+            code = client.run(self.path, argv, [file.fileno() for file in files])
+        finally:
+            for file in files:
+                file.close()
+        with open(names[1], 'rb') as stdout, open(names[2], 'rb') as stderr:
+            return code, stdout.read(), stderr.read()
+
+    def test_requests(self):
+        program = os.path.join(self.directory.name, 'echo.b')
+        with open(program, 'w') as file:
+            file.write(",[.,]")
+        # Twice, the second time the program is prepared already
+        for _ in range(2):
+            self.assertEqual((0, b'abc', b''), self.run_client([program], b'abc'))
+
+        code, stdout, stderr = self.run_client(["+["])
+        self.assertEqual(16, code)
+        self.assertIn(b'Unmatched bracket', stderr)
+        self.assertEqual(64, self.run_client(["--max-steps", "100", "+[]"])[0])
+        self.assertEqual(2, self.run_client(["--no-such-option"])[0])
+
+    def test_no_daemon(self):
+        self.assertIsNone(client.run(self.path + '.missing', ["+"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+__author__ = 'Daniel Maly'
+
+import os
+import tempfile
+import unittest
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from codegen import PythonBinterpreter
+from input_source import InputSource, InputStream
+
+
+class TestInputSource(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def input_file(self, data):
+        filename = os.path.join(self.directory.name, 'input')
+        with open(filename, 'wb') as file:
+            file.write(data)
+        return filename
+
+    def run_program(self, engine, program, data, eof):
+        source = InputSource.for_input_string(program)
+        source.stream = InputStream.for_file(self.input_file(data))
+        source.eof = eof
+        output_receiver = DummyOutputReceiver()
+        engine(source, output_receiver).start()
+        return bytes(output_receiver.output)
+
+    def test_stream(self):
+        data = bytes(range(256)) * 1000
+        stream = InputStream.for_file(self.input_file(data))
+        self.assertEqual(data, bytes(iter(stream.read_byte, None)))
+        self.assertIsNone(InputStream.for_file(self.input_file(b'')).read_byte())
+
+    def test_chunks(self):
+        chunks = [b'ab', b'c', b'']
+        stream = InputStream(lambda size: chunks.pop(0))
+        self.assertEqual(b'abc', bytes(iter(stream.read_byte, None)))
+        self.assertIsNone(stream.read_byte())
+
+    def test_eof(self):
+        # Reads twice past the end of the input after setting the cell to 7
+        program = "+++++++,.,."
+        for engine in (Binterpreter, PythonBinterpreter):
+            self.assertEqual(b'\x00\x00', self.run_program(engine, program, b'', '0'))
+            self.assertEqual(b'\xff\xff', self.run_program(engine, program, b'', '255'))
+            self.assertEqual(b'\x07\x07', self.run_program(engine, program, b'', 'keep'))
+            self.assertEqual(b'ab', self.run_program(engine, program, b'ab', 'keep'))
+            # The input given in the source comes first
+            self.assertEqual(b'xa\x00', self.run_program(engine, ",.,.,.!x", b'a', '0'))
+
+    def test_cat(self):
+        data = os.urandom(10000).replace(b'\x00', b'\x01')
+        for engine in (Binterpreter, PythonBinterpreter):
+            self.assertEqual(data, self.run_program(engine, ",[.,]", data, '0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+__author__ = 'Daniel Maly'
+
+import unittest
+import unittest.mock
+import lockstep
+from binterpreter import Binterpreter
+from input_source import InputSource, InputStream
+from lockstep import Lockstep
+from output_receiver import OutputReceiver
+from quota import Quota, QuotaExceededError
+
+
+class TestLockstep(unittest.TestCase):
+    # Turns letters to upper case, loops a different number of times for every input
+    PROGRAM = ",[>+++++++++[<<+>>-]<<[>>+<<-]>>--------[-<->>+<]<[-<+>>+<]>>[-<<+>>]<<<.[-]>[-]+>[-]<<,]" \
+              ">>>++++++++++[>++++++++++<-]>[<.>-]"
+    INPUTS = [b'', b'a', b'hello', b'\x00abc', b'brainfuck' * 3, b'xyz\xff'] * 3
+
+    def separate(self, program, inputs, eof='0', quota=None):
+        results = []
+        for inp in inputs:
+            source = InputSource(program, "")
+            source.eof = eof
+            source.stream = InputStream(chunk=inp)
+            output = OutputReceiver('full')
+            output.print_to_stdout = False
+            binterpreter = Binterpreter(source, output)
+            binterpreter.quota = quota
+            error = None
+            try:
+                binterpreter.start()
+            except QuotaExceededError as ex:
+                error = str(ex)
+            results.append((output.output_bytes(), binterpreter.step_count, binterpreter.memory,
+                            binterpreter.pointer, error))
+        return results
+
+    def together(self, program, inputs, eof='0', quota=None):
+        source = InputSource(program, "")
+        source.eof = eof
+        run = Lockstep(source, inputs, quota=quota)
+        run.start()
+        return [(lane.output.output_bytes(), lane.step_count, lane.memory, lane.pointer,
+                 str(lane.error) if lane.error is not None else None) for lane in run.lanes]
+
+    @unittest.skipIf(lockstep.numpy is None, "NumPy is not installed")
+    def test_same_as_separate(self):
+        self.assertEqual(self.separate(self.PROGRAM, self.INPUTS), self.together(self.PROGRAM, self.INPUTS))
+        for eof in InputSource.EOF_POLICIES:
+            self.assertEqual(self.separate("+,.>,.>,,.", self.INPUTS, eof), self.together("+,.>,.>,,.", self.INPUTS, eof))
+
+    @unittest.skipIf(lockstep.numpy is None, "NumPy is not installed")
+    def test_idioms(self):
+        # Scans that hit the first cell and transfers that can't be applied to some of the lanes
+        program = ",[>,]<<<[<]>[->>+<<]>[[-<+>]>]<[<<]+>,[.>>[>]<,]"
+        inputs = [bytes([value, 1, 2, value % 3, 4]) for value in range(40)]
+        self.assertEqual(self.separate(program, inputs), self.together(program, inputs))
+
+    @unittest.skipIf(lockstep.numpy is None, "NumPy is not installed")
+    def test_quota(self):
+        # Inputs starting with a zero loop forever
+        program = ",[>++++++++[<++++++++>-]<.,]+[]"
+        inputs = [bytes([value % 3, 66, 67]) for value in range(20)]
+        self.assertEqual(self.separate(program, inputs, quota=Quota(steps=200000)),
+                         self.together(program, inputs, quota=Quota(steps=200000)))
+        self.assertEqual(self.separate(program, inputs, quota=Quota(output=3)),
+                         self.together(program, inputs, quota=Quota(output=3)))
+
+    @unittest.skipIf(lockstep.numpy is None, "NumPy is not installed")
+    def test_wide(self):
+        # Lanes that go too far right are finished on their own, the others get wider memories
+        program = ",[>,]<[<]>[.>]<[<]>[>]>+"
+        inputs = [bytes(range(1, count)) for count in range(1, 40, 2)]
+        with unittest.mock.patch.multiple(Lockstep, MIN_WIDTH=4, MAX_CELLS=400):
+            self.assertEqual(self.separate(program, inputs), self.together(program, inputs))
+
+    def test_without_numpy(self):
+        with unittest.mock.patch('lockstep.numpy', None):
+            self.assertEqual(self.separate(self.PROGRAM, self.INPUTS), self.together(self.PROGRAM, self.INPUTS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+__author__ = 'Daniel Maly'
+
+import itertools
+import unittest
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from compiler import *
+from optimizer import Optimizer
+from tape import Tape
+
+
+class TestOptimizer(unittest.TestCase):
+    def optimized_ops(self, program):
+        return [instruction.op for instruction in Optimizer(Compiler(program).compile()).optimize()]
+
+    def test_recognize_idioms(self):
+        self.assertEqual([CLEAR, OPEN, ADD, CLOSE, END], self.optimized_ops("[-]"))
+        self.assertEqual([SCAN, OPEN, MOVE, CLOSE, END], self.optimized_ops("[<]"))
+        self.assertEqual([MULTIPLY, OPEN, MOVE, ADD, MOVE, ADD, MOVE, ADD, CLOSE, END],
+                         self.optimized_ops("[>+>++<<-]"))
+        self.assertEqual([OPEN, BLOCK, MOVE, ADD, CLOSE, END], self.optimized_ops("[>+]"))
+        self.assertEqual([OPEN, OUT, ADD, CLOSE, END], self.optimized_ops("[.-]"))
+
+    def test_blocks(self):
+        code = Optimizer(Compiler(">+>++<<-.[-<+]").compile()).optimize()
+        self.assertEqual([BLOCK, MOVE, ADD, MOVE, ADD, MOVE, ADD, OUT, OPEN, BLOCK, ADD, MOVE, ADD, CLOSE, END],
+                         [instruction.op for instruction in code])
+        self.assertEqual((7, 8, (((0, 255), (1, 1), (2, 2)), 0, 0, 2)), code[0].arg)
+        self.assertEqual((13, 3, (((-1, 1), (0, 255)), -1, -1, 0)), code[9].arg)
+        self.assertEqual(code[8].end, code[9].end)
+        self.assertEqual([ADD, OUT, BLOCK, ADD, MOVE, ADD, END], self.optimized_ops("+.+>+"))
+        # The loop after the run is replaced by its idiom
+        code = Optimizer(Compiler(">+[-]").compile()).optimize()
+        self.assertEqual([BLOCK, MOVE, ADD, CLEAR, OPEN, ADD, CLOSE, END], [instruction.op for instruction in code])
+        self.assertEqual(3, code[0].arg[0])
+
+    def test_same_result_as_plain_loops(self):
+        programs = [
+            ("[-]>[+]>[>+<-]<<<[>>+>++<<<-]>>>>+++[<-->-]", [3, 2, 5, 7]),
+            (">>>>[<]>[>]<[[-]<]", [3, 3, 0, 2, 2]),
+            ("+++[<<+>>-]", [0]),
+            ("-[>+<+]>>+[<+>>+<-]", [0]),
+            ("+>>++<<<<+>+>>>-<<+++<<<<<<-", [0]),
+            (">>>+++[<<+<<<<+>>>>>>>-<-]<<+>>+++++[-<<<<+>>>->]", [1, 2])
+        ]
+        for (program, memory), bidirectional in itertools.product(programs, (False, True)):
+            results = []
+            for optimize in (False, True):
+                binterpreter = Binterpreter(DummyInputSource(program, []), DummyOutputReceiver(),
+                                            tape=Tape(bidirectional=bidirectional))
+                if not optimize:
+                    binterpreter.code = Compiler(program).compile()
+                binterpreter.initialize_memory(memory)
+                binterpreter.start()
+                results.append((binterpreter.step_count, binterpreter.pointer, bytes(binterpreter.memory)))
+            self.assertEqual(results[0], results[1])
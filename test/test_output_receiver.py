@@ -0,0 +1,84 @@
+__author__ = 'Daniel Maly'
+
+import io
+import sys
+import unittest
+from test.dummy_input_source import DummyInputSource
+from binterpreter import Binterpreter
+from input_source import InputStream
+from output_receiver import OutputReceiver
+
+
+class Stdout(io.TextIOWrapper):
+    def __init__(self):
+        super().__init__(io.BytesIO(), encoding='utf-8')
+
+    def written(self):
+        return self.buffer.getvalue()
+
+
+class TestOutputReceiver(unittest.TestCase):
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = Stdout()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def test_raw_bytes(self):
+        output_receiver = OutputReceiver('full')
+        for char in (0x41, 0xC8, 0xFF):
+            output_receiver.put_char(char)
+        self.assertEqual(b'', sys.stdout.written())
+        output_receiver.flush()
+        self.assertEqual(b'A\xc8\xff', sys.stdout.written())
+
+    def test_flush_policies(self):
+        written = {}
+        for policy in OutputReceiver.FLUSH_POLICIES:
+            sys.stdout = Stdout()
+            output_receiver = OutputReceiver(policy)
+            output_receiver.put_char(0x41)
+            output_receiver.put_char(0x0A)
+            output_receiver.put_char(0x42)
+            output_receiver.before_input()
+            written[policy] = sys.stdout.written()
+        self.assertEqual({'byte': b'A\nB', 'line': b'A\nB', 'input': b'A\nB', 'full': b''}, written)
+
+        sys.stdout = Stdout()
+        output_receiver = OutputReceiver('line')
+        output_receiver.put_char(0x41)
+        output_receiver.put_char(0x0A)
+        output_receiver.put_char(0x42)
+        self.assertEqual(b'A\n', sys.stdout.written())
+
+    def test_put_bytes(self):
+        output_receiver = OutputReceiver('line')
+        output_receiver.put_bytes(b'ab')
+        self.assertEqual(b'', sys.stdout.written())
+        output_receiver.put_bytes(b'c\nd')
+        self.assertEqual(b'abc\nd', sys.stdout.written())
+        self.assertEqual(b'abc\nd', output_receiver.output_bytes())
+
+    def test_buffer_size(self):
+        output_receiver = OutputReceiver('full', buffer_size=4)
+        for char in b'abcdef':
+            output_receiver.put_char(char)
+        self.assertEqual(b'abcd', sys.stdout.written())
+
+    def test_prompt_before_input(self):
+        def read(size):
+            prompts.append(sys.stdout.written())
+            return b'!?' if not prompts[1:] else b''
+
+        prompts = []
+        input_source = DummyInputSource("+++[>++++++++++<-]>+++.,.,.,.", [])
+        input_source.stream = InputStream(read)
+        Binterpreter(input_source, OutputReceiver('input')).start()
+        # Input that is already there doesn't need a flush
+        self.assertEqual([b'!', b'!!?'], prompts)
+        self.assertEqual(b'!!?\x00', sys.stdout.written())
+
+
+if __name__ == '__main__':
+    unittest.main()
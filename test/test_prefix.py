@@ -0,0 +1,94 @@
+__author__ = 'Daniel Maly'
+
+import unittest
+import unittest.mock
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from cache import MemoryCache
+from input_source import InputStream
+from prefix import Prefix
+from snapshot import Snapshot
+from tape import Tape, TapeLimitError
+
+
+class TestPrefix(unittest.TestCase):
+    # Writes 'AB' after a few thousand steps, then echoes its input
+    PROGRAM = "++++++++[>++++++++<-]>+.+.>++++++++++[>++++++++++[>++++++++++[-]<-]<-]<<,[.,]"
+
+    def setUp(self):
+        self.cache = MemoryCache()
+
+    def run_program(self, program=PROGRAM, inp="xyz", tape=None):
+        source = DummyInputSource(program, list(inp))
+        source.stream = InputStream()
+        binterpreter = Binterpreter(source, DummyOutputReceiver(), cache=self.cache, tape=tape)
+        binterpreter.prefix = Prefix(self.cache)
+        binterpreter.start()
+        return binterpreter
+
+    def stored(self, program=PROGRAM, kind=Prefix.KIND):
+        data = self.cache.load(program, kind)
+        return Snapshot.unpack(data) if data is not None else None
+
+    def test_first_input(self):
+        first = self.run_program()
+        snapshot = self.stored()
+        self.assertEqual(self.PROGRAM.index(','), snapshot.position)
+        self.assertEqual(b'AB', snapshot.output)
+        self.assertEqual(first.step_count - 12, snapshot.step_count)
+
+        second = self.run_program(inp="hello")
+        self.assertEqual(b'ABhello', second.output.output_bytes())
+        self.assertEqual(first.step_count + 6, second.step_count)
+        self.assertEqual(b'\x00B\x00\x00\x00', second.memory)
+
+    def test_no_input(self):
+        program = "++++++[>++++++++<-]>+.#+.+."
+        first = self.run_program(program)
+        self.assertEqual(program.index('#'), self.stored(program).position)
+        second = self.run_program(program)
+        self.assertEqual(b'123', second.output.output_bytes())
+        self.assertEqual((first.step_count, first.memory), (second.step_count, second.memory))
+
+        program = "++++++[>++++++++<-]>+.+.+."
+        first = self.run_program(program)
+        self.assertEqual(len(program), self.stored(program).position)
+        second = self.run_program(program)
+        self.assertEqual(b'123', second.output.output_bytes())
+        self.assertEqual(first.step_count, second.step_count)
+
+    def test_restored(self):
+        self.run_program()
+        # A prefix that isn't the real one shows that the program starts from the stored state
+        snapshot = self.stored()
+        snapshot.output = b'CD'
+        self.cache.store(self.PROGRAM, Prefix.KIND, snapshot.pack())
+        self.assertEqual(b'CDxyz', self.run_program().output.output_bytes())
+
+    def test_not_used(self):
+        source = DummyInputSource(self.PROGRAM, [])
+        source.stream = InputStream()
+        binterpreter = Binterpreter(source, DummyOutputReceiver(), cache=self.cache)
+        binterpreter.prefix = Prefix(self.cache)
+        binterpreter.print_steps = True
+        with unittest.mock.patch('sys.stdout'):
+            binterpreter.start()
+        self.assertIsNone(self.stored())
+
+    def test_tape(self):
+        program = "<<+>>+++[>++<-]>.,"
+        self.run_program(program, tape=Tape(bidirectional=True))
+        self.assertIsNone(self.stored(program))
+        self.assertEqual(2, self.stored(program, Prefix.KIND + '-bidirectional').origin)
+
+        self.run_program(program)
+        self.assertEqual(0, self.stored(program).origin)
+        self.assertEqual(b'\x01\x00\x00\x06', self.stored(program).memory)
+        self.assertEqual(b'\x06', self.run_program(program, tape=Tape(limit=4)).output.output_bytes())
+        with self.assertRaises(TapeLimitError):
+            self.run_program(program, tape=Tape(limit=3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+__author__ = 'Daniel Maly'
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from profiler import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def profile(self, program):
+        binterpreter = Binterpreter(DummyInputSource(program, []), DummyOutputReceiver())
+        binterpreter.profiler = Profiler(binterpreter.code, binterpreter.program)
+        binterpreter.start()
+        return binterpreter, binterpreter.profiler
+
+    def test_steps(self):
+        program = "++++++++[>++++[>++>+++>+++>+<<<<-]>+>+>->>+[<]<-]>>.>---.+++++++..+++.>>.<-.<" \
+                  ".+++.------.--------.>>+.>++."
+        binterpreter, profiler = self.profile(program)
+        plain = Binterpreter(DummyInputSource(program, []), DummyOutputReceiver())
+        plain.start()
+        self.assertEqual(plain.step_count, binterpreter.step_count)
+        self.assertEqual(binterpreter.step_count, profiler.total_steps())
+
+    def test_loops(self):
+        # The outer loop runs 3 times, the inner one is replaced by its idiom and moves 2 to the next cell every time
+        _, profiler = self.profile("+++[>++[>+<-]<-]")
+        outer, inner = profiler.loops()
+        self.assertEqual((3, 1, 3), (outer['position'], outer['entries'], outer['iterations']))
+        self.assertEqual((7, 3, 6), (inner['position'], inner['entries'], inner['iterations']))
+        self.assertEqual("[>+<-]", inner['source'])
+        self.assertEqual(2.0, inner['average_iterations'])
+        # 1 step for [ and 5 for every iteration
+        self.assertEqual(3 * (1 + 2 * 5), inner['steps'])
+        # Everything but +++ and the end
+        self.assertEqual(profiler.total_steps() - 4, outer['steps'])
+
+    def test_loop_never_entered(self):
+        _, profiler = self.profile("[>+<-]+")
+        loop, = profiler.loops()
+        self.assertEqual((1, 0, 1), (loop['entries'], loop['iterations'], loop['steps']))
+
+    def test_report(self):
+        _, profiler = self.profile("+++[>++[>+<-]<-]")
+        report = io.StringIO()
+        profiler.print_report(report)
+        self.assertIn("[>+<-]", report.getvalue())
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'profile.json')
+            profiler.write_json(filename)
+            with open(filename) as file:
+                self.assertEqual(profiler.as_dict(), json.load(file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+__author__ = 'Daniel Maly'
+
+import io
+import sys
+import unittest
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from codegen import PythonBinterpreter
+from output_receiver import OutputReceiver
+from quota import Quota, QuotaExceededError
+from tape import Tape, TapeLimitError
+
+
+class TestQuota(unittest.TestCase):
+    def run_program(self, program, quota, engine=Binterpreter, output_receiver=None, tape=None):
+        binterpreter = engine(DummyInputSource(program, []), output_receiver or DummyOutputReceiver(), tape=tape)
+        binterpreter.quota = quota
+        binterpreter.start()
+        return binterpreter
+
+    def test_steps(self):
+        for steps in (10, 1000, 100000):
+            with self.assertRaises(QuotaExceededError) as context:
+                self.run_program("+[]", Quota(steps=steps))
+            self.assertEqual('steps', context.exception.resource)
+
+        binterpreter = self.run_program("+++[>++[>+<-]<-]", Quota(steps=1000))
+        self.assertTrue(binterpreter.terminated)
+
+    def test_steps_checked_in_batches(self):
+        binterpreter = Binterpreter(DummyInputSource("+[]", []), DummyOutputReceiver())
+        binterpreter.quota = Quota(steps=Quota.BATCH * 3)
+        with self.assertRaises(QuotaExceededError):
+            binterpreter.start()
+        self.assertGreater(binterpreter.step_count, Quota.BATCH * 3)
+        self.assertLess(binterpreter.step_count, Quota.BATCH * 3 + 10)
+
+    def test_time(self):
+        for engine in (Binterpreter, PythonBinterpreter):
+            with self.assertRaises(QuotaExceededError) as context:
+                self.run_program("+[]", Quota(seconds=0.1), engine)
+            self.assertEqual('time', context.exception.resource)
+
+    def test_output(self):
+        stdout = sys.stdout
+        sys.stdout = io.TextIOWrapper(io.BytesIO())
+        try:
+            for engine in (Binterpreter, PythonBinterpreter):
+                output_receiver = OutputReceiver('byte')
+                output_receiver.limit = 5
+                with self.assertRaises(QuotaExceededError) as context:
+                    self.run_program("+[.+]", Quota(output=5), engine, output_receiver)
+                self.assertEqual('output', context.exception.resource)
+                self.assertEqual(5, output_receiver.written)
+        finally:
+            sys.stdout = stdout
+
+        # Output that is not printed is checked along with the steps
+        with self.assertRaises(QuotaExceededError):
+            self.run_program("+[.]", Quota(output=5))
+
+    def test_tape(self):
+        with self.assertRaises(QuotaExceededError) as context:
+            self.run_program("+[>+]", None, tape=Tape(limit=100))
+        self.assertIsInstance(context.exception, TapeLimitError)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+__author__ = 'Daniel Maly'
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from recorder import TraceRecorder, TraceFormatError
+from tape import Tape, PagedTape
+from util import *
+
+
+class TestTraceRecorder(unittest.TestCase):
+    PROGRAM = "++++++++[>++++[>++>+++>+++>+<<<<-]>+>+>->>+[<]<-]>>.>---.+++++++..+++.>>.<-.<" \
+              ".+++.------.--------.>>+.>++."
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'trace.bxt')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def printed_steps(self, program, tape=None):
+        binterpreter = Binterpreter(DummyInputSource(program, []), DummyOutputReceiver(), tape=tape)
+        binterpreter.print_steps = True
+        steps = io.StringIO()
+        with contextlib.redirect_stdout(steps):
+            binterpreter.start()
+        return steps.getvalue()
+
+    def decoded_trace(self, program, recorder, tape=None):
+        output_receiver = DummyOutputReceiver()
+        binterpreter = Binterpreter(DummyInputSource(program, []), output_receiver, tape=tape)
+        binterpreter.recorder = recorder
+        binterpreter.start()
+        self.assertEqual("Hello World!\n", string_from_array(output_receiver.output))
+        steps = io.StringIO()
+        TraceRecorder.decode(self.filename, steps)
+        return steps.getvalue()
+
+    def test_same_as_printed(self):
+        # A small capacity makes the buffer fill up several times
+        recorder = TraceRecorder(open(self.filename, 'wb'), capacity=7)
+        self.assertEqual(self.printed_steps(self.PROGRAM), self.decoded_trace(self.PROGRAM, recorder))
+
+    def test_last_steps(self):
+        for last in (1, 5, 100):
+            recorder = TraceRecorder.for_file(self.filename, last=last)
+            expected = self.printed_steps(self.PROGRAM).splitlines(True)[-last:]
+            self.assertEqual("".join(expected), self.decoded_trace(self.PROGRAM, recorder))
+
+    def test_bidirectional(self):
+        program = "<<<" + self.PROGRAM
+        for tape in (Tape, PagedTape):
+            recorder = TraceRecorder.for_file(self.filename)
+            self.assertEqual(self.printed_steps(program, tape(bidirectional=True)),
+                             self.decoded_trace(program, recorder, tape(bidirectional=True)))
+
+    def test_not_a_trace(self):
+        with open(self.filename, 'wb') as file:
+            file.write(b'S 1 ## I 1')
+        with self.assertRaises(TraceFormatError):
+            list(TraceRecorder.records(self.filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+__author__ = 'Daniel Maly'
+
+import os
+import tempfile
+import unittest
+import unittest.mock
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from input_source import InputStream
+from quota import Quota, QuotaExceededError
+from snapshot import Snapshot, Snapshotter, SnapshotError
+from tape import Tape, PagedTape
+
+
+class TestSnapshot(unittest.TestCase):
+    # Reads three bytes and prints each of them after every step of a long count down
+    PROGRAM = ",>,>,>++++[>++++++++++[>++++++++++[-<<<<<.>.>.>>>]<-]<-]"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'snapshot.bxs')
+        self.input = os.path.join(self.directory.name, 'input')
+        with open(self.input, 'wb') as file:
+            file.write(b'xyz')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def binterpreter(self, program=PROGRAM, tape=None):
+        source = DummyInputSource(program, [])
+        source.stream = InputStream.for_file(self.input)
+        return Binterpreter(source, DummyOutputReceiver(), tape=tape)
+
+    def test_resume(self):
+        full = self.binterpreter()
+        full.start()
+
+        for every in (1, 100, 1000):
+            stopped = self.binterpreter()
+            stopped.snapshotter = Snapshotter(self.filename, every)
+            stopped.quota = Quota(steps=5000)
+            with self.assertRaises(QuotaExceededError):
+                stopped.start()
+
+            snapshot = Snapshot.read(self.filename)
+            self.assertLessEqual(snapshot.step_count, 5000)
+            self.assertGreater(snapshot.step_count, 5000 - every - Quota.BATCH)
+
+            resumed = self.binterpreter()
+            snapshot.restore(resumed)
+            resumed.start()
+            self.assertEqual(full.step_count, resumed.step_count)
+            self.assertEqual(full.memory, resumed.memory)
+            self.assertEqual(full.output.output, resumed.output.output)
+
+    def test_resume_step_by_step(self):
+        stopped = self.binterpreter()
+        stopped.snapshotter = Snapshotter(self.filename, 777)
+        stopped.quota = Quota(steps=3000)
+        stopped.print_steps = True
+        with self.assertRaises(QuotaExceededError):
+            with open(os.devnull, 'w') as devnull, unittest.mock.patch('sys.stdout', devnull):
+                stopped.start()
+
+        resumed = self.binterpreter()
+        Snapshot.read(self.filename).restore(resumed)
+        resumed.start()
+        full = self.binterpreter()
+        full.start()
+        self.assertEqual((full.step_count, full.output.output), (resumed.step_count, resumed.output.output))
+
+    def test_breakpoint(self):
+        program = "+++[>++<-]#>>+<<"
+        for tape in (Tape, PagedTape):
+            binterpreter = self.binterpreter(program, tape(bidirectional=True))
+            binterpreter.snapshotter = Snapshotter(self.filename)
+            binterpreter.print_debug_info = lambda: None
+            binterpreter.start()
+
+            snapshot = Snapshot.read(self.filename)
+            self.assertEqual(program.index('#') + 1, snapshot.position)
+            self.assertEqual(b'\x00\x06', snapshot.memory)
+            resumed = self.binterpreter(program, tape(bidirectional=True))
+            resumed.print_debug_info = lambda: None
+            snapshot.restore(resumed)
+            resumed.start()
+            self.assertEqual((binterpreter.memory, binterpreter.pointer), (resumed.memory, resumed.pointer))
+
+    def test_other_program(self):
+        self.binterpreter("+#").start()
+        binterpreter = self.binterpreter("+#")
+        binterpreter.snapshotter = Snapshotter(self.filename)
+        binterpreter.print_debug_info = lambda: None
+        binterpreter.start()
+        with self.assertRaises(SnapshotError):
+            Snapshot.read(self.filename).restore(self.binterpreter("-#"))
+
+
+if __name__ == '__main__':
+    unittest.main()
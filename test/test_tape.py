@@ -0,0 +1,83 @@
+__author__ = 'Daniel Maly'
+
+import unittest
+from test.dummy_input_source import DummyInputSource
+from test.dummy_output_receiver import DummyOutputReceiver
+from binterpreter import Binterpreter
+from codegen import PythonBinterpreter
+from tape import Tape, PagedTape, PagedMemory, MmapTape, TapeLimitError
+
+
+class TestTape(unittest.TestCase):
+    def test_grow(self):
+        tape = Tape(capacity=4)
+        self.assertEqual(b'\x00', tape.dump())
+        self.assertEqual(4, len(tape.data))
+        self.assertEqual(6, tape.grow(5))
+        self.assertEqual(bytes(6), tape.dump())
+        self.assertEqual(0, tape.grow_left(-3))
+        self.assertEqual(6, len(tape))
+
+    def test_grow_left(self):
+        tape = Tape(b'\x01\x02', bidirectional=True)
+        position = tape.grow_left(-2)
+        self.assertEqual(tape.origin - 2, position)
+        self.assertEqual(b'\x00\x00\x01\x02', tape.dump())
+        self.assertEqual(position - 1, tape.grow_left(position - 1))
+        self.assertEqual(b'\x00\x00\x00\x01\x02', tape.dump())
+
+    def test_limit(self):
+        tape = Tape(limit=3, bidirectional=True)
+        tape.grow(2)
+        with self.assertRaises(TapeLimitError):
+            tape.grow(3)
+        with self.assertRaises(TapeLimitError):
+            tape.grow_left(-1)
+
+    def test_bidirectional_program(self):
+        program = "+<<++[<+>-]>>>+[<]<<[>]"
+        for engine in (Binterpreter, PythonBinterpreter):
+            binterpreter = engine(DummyInputSource(program, []), DummyOutputReceiver(), tape=Tape(bidirectional=True))
+            binterpreter.start()
+            self.assertEqual(b'\x02\x00\x00\x01\x01', binterpreter.memory)
+            self.assertEqual(1, binterpreter.pointer)
+
+            binterpreter = engine(DummyInputSource(program, []), DummyOutputReceiver(), tape=Tape(limit=4))
+            with self.assertRaises(TapeLimitError):
+                binterpreter.start()
+
+    def test_paged_memory(self):
+        memory = PagedMemory(1 << 40)
+        self.assertEqual(0, memory[123456789])
+        memory[123456789] = 0
+        self.assertEqual({}, memory.pages)
+        memory[5000] = 7
+        self.assertEqual(1, len(memory.pages))
+        self.assertEqual(5000, memory.find(b'\x07'))
+        self.assertEqual(0, memory.find(b'\x00'))
+        self.assertEqual(8191, memory.rfind(b'\x00', 0, 8192))
+        for index in range(4096, 8192):
+            memory[index] = 1
+        self.assertEqual(8192, memory.find(b'\x00', 4096))
+        self.assertEqual(4095, memory.rfind(b'\x00', 0, 8192))
+
+    def test_other_tapes(self):
+        program = ">>>+[-<+>]<[>]<[<]>>,[.>]+++" + ">" * 10000 + "+#"
+        results = []
+        for tape in (Tape(), PagedTape(), MmapTape(), PagedTape(bidirectional=True), MmapTape(bidirectional=True)):
+            for engine in (Binterpreter, PythonBinterpreter):
+                output_receiver = DummyOutputReceiver()
+                output_receiver.print_debug_data = lambda input_debug_data, binterpreter: None
+                binterpreter = engine(DummyInputSource(program, "abc"), output_receiver, tape=tape)
+                binterpreter.initialize_memory(b'\x00\x05')
+                binterpreter.start()
+                results.append((binterpreter.memory, binterpreter.pointer, bytes(output_receiver.output)))
+        for result in results:
+            self.assertEqual(results[0], result)
+        self.assertEqual(b'a', results[0][2])
+
+    def test_paged_debug_memory(self):
+        tape = PagedTape(b'\x01\x02')
+        tape.data[tape.origin + 10000] = 3
+        self.assertEqual("0: {}\n8192: {}".format(b'\x01\x02' + bytes(4094), bytes(1808) + b'\x03' + bytes(2287)),
+                         tape.debug_memory())